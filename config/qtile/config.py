@@ -1,4 +1,5 @@
 """Qtile configuration."""
+import asyncio
 import copy
 import os
 import subprocess
@@ -17,6 +18,7 @@ from qtilemods.layout.floating import Floating
 from qtilemods.layout.tiling import Bsp, Max, MonadTall
 from qtilemods.tools.gtk import set_gtk_settings
 from qtilemods.tools.portal import portals_start, portals_stop
+from qtilemods.tools.slideshow import slideshow
 from qtilemods.tools.xrdb import xrdb_merge
 from qtilemods.tools import inhibit, shortcuts
 from qtilemods.widget.battery import Battery
@@ -706,6 +708,8 @@ def startup():
     qtile.ss_inhibit = 0
     qtile.pm_inhibit = 0
 
+    slideshow.start(interval=60 * 5)
+
 
 @hook.subscribe.shutdown
 def shutdown():
@@ -716,11 +720,13 @@ def shutdown():
         subprocess.call(['pkill', 'fcitx5'])
     subprocess.call(['pkill', 'picom'])
     inhibit.uninhibit_dbus()
+    slideshow.stop()
 
 
 @hook.subscribe.screens_reconfigured
 def screens_reconfigured():
     shortcuts.remap_screens(qtile)
+    asyncio.ensure_future(slideshow.refresh())
 
 
 # hook.subscribe.float_change(inhibit.float_change_dbus)
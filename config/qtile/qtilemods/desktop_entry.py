@@ -1,7 +1,26 @@
+import configparser
 import os
 
 from xdg import DesktopEntry
 
+from libqtile.log_utils import logger
+
+from .tools import inotify
+
+APPLICATIONS_DIRS = (
+    os.path.expanduser('~/.local/share/applications'),
+    '/usr/local/share/applications',
+    '/usr/share/applications',
+    '/var/lib/flatpak/exports/share/applications',
+)
+
+WATCH_MASK = (
+    inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO | inotify.IN_MOVED_FROM |
+    inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_ONLYDIR
+)
+# on the closest existing parent of a missing applications directory
+PARENT_MASK = inotify.IN_CREATE | inotify.IN_MOVED_TO | inotify.IN_ONLYDIR
+
 
 def get_desktop_entry_path(appname):
     if os.path.isabs(appname):
@@ -31,3 +50,178 @@ def get_desktop_entry_path(appname):
                 continue
 
             return DesktopEntry(filepath)
+
+
+def read_desktop_file(filepath):
+    config = configparser.ConfigParser()
+
+    try:
+        with open(os.path.join(filepath), 'r') as f:
+            data = f.read().replace('%', '%%')
+            config.read_string(data)
+
+    except (configparser.Error, KeyError, OSError, UnicodeDecodeError):
+        logger.exception(f'Cannot read file {filepath}:')
+
+    return config
+
+
+class DesktopCatalog(object):
+    """Parsed .desktop files of the applications directories
+
+    Files are parsed once and kept up to date from inotify events, the
+    indexes follow the directories precedence (first directory wins).
+    """
+
+    def __init__(self, dirs=APPLICATIONS_DIRS):
+        self.dirs = dirs
+        self.entries = {}
+        self.by_id = {}
+        self.by_window_class = {}
+        self.generation = 0
+        self._loaded = False
+        self._inotify = None
+        self._watched = set()
+        self._parents = set()
+
+    def load(self):
+        self.entries = {}
+
+        for apps_path in self.dirs:
+            if not os.path.isdir(apps_path):
+                continue
+
+            for filename in sorted(os.listdir(apps_path)):
+                if not filename.endswith('.desktop'):
+                    continue
+
+                filepath = os.path.join(apps_path, filename)
+                self.entries[filepath] = read_desktop_file(filepath)
+
+        self._loaded = True
+        self._index()
+
+    def _index(self):
+        by_id = {}
+        by_window_class = {}
+
+        for filepath, desktop in self.items():
+            if 'Desktop Entry' not in desktop:
+                continue
+
+            entry = desktop['Desktop Entry']
+            file_id = os.path.basename(filepath)[:-len('.desktop')]
+            by_id.setdefault(file_id, (filepath, desktop))
+            # a window class is looked up by Name or StartupWMClass
+            if 'Name' in entry:
+                by_window_class.setdefault(entry['Name'].lower(), (filepath, desktop))
+            if 'StartupWMClass' in entry:
+                by_window_class.setdefault(entry['StartupWMClass'].lower(), (filepath, desktop))
+
+        self.by_id = by_id
+        self.by_window_class = by_window_class
+        self.generation += 1
+
+    def _sort_key(self, filepath):
+        dirname, filename = os.path.split(filepath)
+        return self.dirs.index(dirname), filename
+
+    def items(self):
+        if not self._loaded:
+            self.load()
+        return list(self.entries.items())
+
+    def get(self, file_id):
+        if not self._loaded:
+            self.load()
+        return self.by_id.get(file_id, (None, None))
+
+    def find_window_class(self, wm_class):
+        if not self._loaded:
+            self.load()
+        return self.by_window_class.get(wm_class.lower(), (None, None))
+
+    def watch(self):
+        if self._inotify is not None:
+            return
+
+        try:
+            self._inotify = inotify.Inotify()
+            self._watch_dirs()
+            self._inotify.start(self._on_event)
+        except (OSError, AttributeError):
+            logger.exception('Cannot watch applications directories:')
+            self.unwatch()
+
+    def _watch_dirs(self):
+        """Watch the directories that exist, the parent of those that do not
+
+        Returns whether a directory is watched that was not before.
+        """
+        added = False
+        for apps_path in self.dirs:
+            if apps_path in self._watched:
+                continue
+
+            if os.path.isdir(apps_path):
+                self._inotify.add_watch(apps_path, WATCH_MASK)
+                self._watched.add(apps_path)
+                added = True
+                continue
+
+            parent = os.path.dirname(apps_path)
+            while not os.path.isdir(parent) and parent != os.path.dirname(parent):
+                parent = os.path.dirname(parent)
+            if parent not in self._parents and parent not in self._watched:
+                self._inotify.add_watch(parent, PARENT_MASK)
+                self._parents.add(parent)
+        return added
+
+    def unwatch(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._watched = set()
+        self._parents = set()
+
+    def _on_event(self, path, mask, name):
+        if mask & inotify.IN_Q_OVERFLOW:
+            self.load()
+            return
+
+        if mask & inotify.IN_IGNORED:
+            # the directory is gone, watch for it to come back
+            self._watched.discard(path)
+            self._parents.discard(path)
+            self._watch_dirs()
+            self.load()
+            return
+
+        if path in self._parents:
+            if mask & inotify.IN_ISDIR and self._watch_dirs():
+                self.load()
+            return
+
+        if path is None or not name.endswith('.desktop'):
+            return
+
+        filepath = os.path.join(path, name)
+        if mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+            if self.entries.pop(filepath, None) is None:
+                return
+        elif mask & inotify.IN_CREATE and not os.path.islink(filepath):
+            # a regular file is read once written, on IN_CLOSE_WRITE
+            return
+        else:
+            self.entries[filepath] = read_desktop_file(filepath)
+            self.entries = dict(sorted(
+                self.entries.items(), key=lambda item: self._sort_key(item[0])))
+
+        self._index()
+
+
+# qtile re-executes this module on reload_config, keep the parsed catalog
+try:
+    catalog
+except NameError:
+    catalog = DesktopCatalog()
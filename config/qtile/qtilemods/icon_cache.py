@@ -0,0 +1,284 @@
+import asyncio
+import cairocffi
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+
+from functools import partial
+
+from libqtile import images
+from libqtile.log_utils import logger
+
+from .icon_theme import get_icon_path, get_theme_files
+
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'qtilemods', 'icons')
+LOOKUP_PATH = os.path.join(CACHE_DIR, 'lookup.json')
+
+# magic, width, height, stride; followed by ARGB32 pixel rows
+HEADER = struct.Struct('<4sIII')
+MAGIC = b'QIC1'
+# seconds of quiet before the lookup is written
+FLUSH_DELAY = 2
+
+# qtile re-executes this module on reload_config, keep what was loaded
+try:
+    _images, _lookup, _stamps
+except NameError:
+    # (icon path, foreground, size) -> CachedImage, shared by every widget
+    _images = {}
+    # {'themes': {theme: {'stamp': [[index.theme, mtime], ...], 'icons': {key: found path}}},
+    #  'entries': {entry file name: [icon path, mtime]}}
+    _lookup = None
+    # theme -> stamp, the theme files are checked once per session
+    _stamps = {}
+    _dirty = False
+    _flush_handle = None
+
+
+class CachedImage(object):
+    def __init__(self, surface, buffer=None):
+        self.surface = surface
+        self.width = surface.get_width()
+        self.height = surface.get_height()
+        self.pattern = cairocffi.SurfacePattern(surface)
+        # keep the mapping alive for as long as cairo reads from it
+        self._buffer = buffer
+
+
+def _replace_svg_attr(foreground, match):
+    attr = match.group(0)
+    color = match.group(1)
+    delta = 255
+
+    if re.match(r'#[A-Fa-f0-9]{6}', color):
+        r = int(color[1:3], 16)
+        g = int(color[3:5], 16)
+        b = int(color[5:7], 16)
+        delta = max((abs(r - g), abs(r - b), abs(g - b)))
+
+    elif color in ('gray', 'grey', 'black', 'white'):
+        delta = 0
+
+    if delta < 32:
+        return attr.replace(color, foreground)
+    return attr
+
+
+def recolor_svg(data, foreground):
+    replace = partial(_replace_svg_attr, foreground)
+    data = re.sub(r'fill="(#?[A-Za-z0-9]+)"', replace, data)
+    data = re.sub(r'"fill:(#?[A-Za-z0-9]+)"', replace, data)
+    return data
+
+
+def _write_atomic(filepath, data):
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filepath))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, filepath)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+
+def _entry_path(path, mtime, foreground, size):
+    key = repr((path, mtime, foreground, size)).encode()
+    return os.path.join(CACHE_DIR, hashlib.sha1(key).hexdigest() + '.argb')
+
+
+def _read_entry(filepath):
+    with open(filepath, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    magic, width, height, stride = HEADER.unpack_from(buffer)
+    if magic != MAGIC or len(buffer) < HEADER.size + stride * height:
+        buffer.close()
+        return
+
+    data = memoryview(buffer)[HEADER.size:]
+    surface = cairocffi.ImageSurface.create_for_data(
+        data, cairocffi.FORMAT_ARGB32, width, height, stride)
+    return CachedImage(surface, buffer)
+
+
+def _write_entry(filepath, surface):
+    surface.flush()
+    header = HEADER.pack(
+        MAGIC, surface.get_width(), surface.get_height(), surface.get_stride())
+    _write_atomic(filepath, header + bytes(surface.get_data()))
+
+
+def _rasterize(path, foreground, size):
+    if path.endswith('.svg'):
+        with open(path, 'r') as f:
+            data = f.read()
+            if foreground:  # symbolic icon
+                data = recolor_svg(data, foreground)
+            img = images.Img(data.encode(), path, path)
+    else:
+        with open(path, 'rb') as f:
+            img = images.Img(f.read(), path, path)
+
+    img.resize(height=size)
+    surface = cairocffi.ImageSurface(
+        cairocffi.FORMAT_ARGB32, max(round(img.width), 1), max(round(img.height), 1))
+    ctx = cairocffi.Context(surface)
+    ctx.set_source(img.pattern)
+    ctx.paint()
+    return surface
+
+
+def load_image(path, foreground, size):
+    key = (path, foreground, size)
+    img = _images.get(key)
+    if img is not None:
+        return img
+
+    mtime = os.stat(path).st_mtime_ns
+    filepath = _entry_path(path, mtime, foreground, size)
+    try:
+        img = _read_entry(filepath)
+    except (OSError, ValueError, struct.error):
+        img = None
+
+    if img is None:
+        surface = _rasterize(path, foreground, size)
+        try:
+            _write_entry(filepath, surface)
+        except OSError:
+            logger.exception(f'Cannot write icon cache {filepath}:')
+        else:
+            _load_lookup()['entries'][os.path.basename(filepath)] = [path, mtime]
+            _mark_dirty()
+        img = CachedImage(surface)
+
+    _images[key] = img
+    return img
+
+
+def _load_lookup():
+    global _lookup
+
+    if _lookup is None:
+        try:
+            with open(LOOKUP_PATH, 'r') as f:
+                _lookup = json.load(f)
+        except (OSError, ValueError):
+            _lookup = {}
+
+        if 'themes' not in _lookup or 'entries' not in _lookup:
+            # written by an older version
+            _lookup = {'themes': {}, 'entries': {}}
+
+    return _lookup
+
+
+def flush():
+    """Write the lookup if it changed"""
+    global _dirty, _flush_handle
+
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+
+    if not _dirty:
+        return
+
+    _dirty = False
+    try:
+        _write_atomic(LOOKUP_PATH, json.dumps(_lookup).encode())
+    except OSError:
+        logger.exception(f'Cannot write icon cache {LOOKUP_PATH}:')
+
+
+def _mark_dirty():
+    global _dirty, _flush_handle
+
+    _dirty = True
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # no loop in this thread, the next flush() writes it
+        _flush_handle = None
+        return
+    _flush_handle = loop.call_later(FLUSH_DELAY, flush)
+
+
+def _prune():
+    """Remove entries rasterized from icons that changed since"""
+    entries = _load_lookup()['entries']
+    for name, (path, mtime) in list(entries.items()):
+        try:
+            current = os.stat(path).st_mtime_ns
+        except OSError:
+            current = None
+
+        if current != mtime:
+            try:
+                os.unlink(os.path.join(CACHE_DIR, name))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.exception(f'Cannot remove icon cache {name}:')
+                continue
+            del entries[name]
+            _mark_dirty()
+
+
+def _get_stamp(theme):
+    stamp = _stamps.get(str(theme))
+    if stamp is None:
+        stamp = _stamps[str(theme)] = [
+            [fp, os.stat(fp).st_mtime_ns] for fp in get_theme_files(theme)]
+    return stamp
+
+
+def lookup_icon(iconname, size=None, theme=None, extensions=('png', 'svg', 'xpm')):
+    if os.path.isabs(iconname):
+        return iconname
+
+    themes = _load_lookup()['themes']
+    stamp = _get_stamp(theme)
+    entry = themes.get(str(theme))
+    if entry is None or entry['stamp'] != stamp:
+        if entry is not None:
+            # the theme changed, so may have its icons
+            _prune()
+        entry = themes[str(theme)] = {'stamp': stamp, 'icons': {}}
+        _mark_dirty()
+
+    key = '{}:{}:{}'.format(iconname, size, ','.join(extensions))
+    icon = entry['icons'].get(key)
+    if icon is not None and os.path.exists(icon):
+        return icon
+
+    icon = get_icon_path(iconname, size=size, theme=theme, extensions=extensions)
+    if icon is None:
+        # misses are not kept, the icon may be installed later
+        if entry['icons'].pop(key, 0) != 0:
+            _mark_dirty()
+        return None
+
+    entry['icons'][key] = icon
+    _mark_dirty()
+    return icon
+
+
+def clear():
+    global _lookup
+
+    flush()
+    _images.clear()
+    _stamps.clear()
+    _lookup = None
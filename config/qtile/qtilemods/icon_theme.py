@@ -17,3 +17,17 @@ def get_icon_path(iconname, size=None, theme=None, extensions=('png', 'svg', 'xp
         icon = IconTheme.LookupIcon(iconname, size, thme, extensions)
         if icon:
             return icon
+
+
+def get_theme_files(theme):
+    if not theme:
+        return []
+
+    files = []
+    for d in IconTheme.icondirs:
+        for filename in ('index.theme', 'index.desktop'):
+            filepath = os.path.join(d, theme, filename)
+            if os.path.isfile(filepath):
+                files.append(filepath)
+
+    return files
@@ -1,4 +1,6 @@
-from libqtile import layout
+from libqtile import hook, layout
+
+from .rules import CompiledRules
 
 
 class Floating(layout.Floating):
@@ -9,12 +11,54 @@ class Floating(layout.Floating):
         self.float_rules_exclude = float_rules_exclude or []
         self.tiling_rules = tiling_rules or []
 
+        self._float_rules = CompiledRules(self.float_rules)
+        self._float_rules_exclude = CompiledRules(self.float_rules_exclude)
+        self._tiling_rules = CompiledRules(self.tiling_rules)
+        # wid: ((wm_class, title), floating), shared by the group clones
+        self._matches = {}
+
+        hook.subscribe.client_name_updated(self._on_name_updated)
+        hook.subscribe.client_killed(self.forget)
+
     def focus(self, client):
         super().focus(client)
         client.bring_to_front()
 
+    def forget(self, win):
+        self._matches.pop(win.wid, None)
+
+    def decided(self, win):
+        return win.wid in self._matches
+
+    def apply(self, win):
+        if win.group is None:
+            # killed or not managed yet
+            return
+
+        floating = self.match(win)
+        if not win.fullscreen and win.floating != floating:
+            win.floating = floating
+
+    def _on_name_updated(self, win):
+        cached = self._matches.pop(win.wid, None)
+        floating = self.match(win)
+        # keep what qtile or the user decided unless the rules now say otherwise
+        if cached is not None and cached[1] != floating:
+            self.apply(win)
+
     def match(self, win):
-        return ((
-            any(win.match(rule) for rule in self.float_rules) and
-            not any(win.match(rule) for rule in self.float_rules_exclude)
-        ) or not any(win.match(rule) for rule in self.tiling_rules))
+        wm_class = tuple(win.get_wm_class() or ())
+        title = win.name
+        key = (wm_class, title)
+
+        cached = self._matches.get(win.wid)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        floating = ((
+            self._float_rules.matches(win, wm_class, title) and
+            not self._float_rules_exclude.matches(win, wm_class, title)
+        ) or not self._tiling_rules.matches(win, wm_class, title))
+
+        self._matches[win.wid] = (key, floating)
+        return floating
@@ -0,0 +1,186 @@
+"""Micro-benchmark of the floating decision in the tiling layouts
+
+Opens windows across groups on a simulated qtile, the way Group.add,
+Group.layout_all and Group.mark_floating drive the layouts, and counts
+the relayouts and floating_layout.match calls per window open. The old
+RuleMatchMixin, which reassigned client.floating on every configure,
+is compared with the current one. Run from the qtile config directory:
+
+    python -m qtilemods.layout.relayout_benchmark [windows] [groups] [repeat]
+
+As in config.py, windows float unless a tiling rule matches them. Every
+fifth window is a transient dialog qtile floats although the rules would
+tile it, every tenth one is floated by the rules and then tiled by hand.
+Every window changes its title once after it is mapped.
+"""
+import sys
+import timeit
+
+from libqtile.config import Match
+
+from .floating import Floating
+from .tiling import RuleMatchMixin
+
+
+class OldRuleMatchMixin(object):
+    """RuleMatchMixin before the floating decision was cached"""
+
+    def configure(self, client, screen_rect):
+        super().configure(client, screen_rect)
+        client.floating = client.group.floating_layout.match(client)
+
+
+class OldFloating(Floating):
+    """Floating before the decision was kept, title changes only reset it"""
+
+    def _on_name_updated(self, win):
+        self.forget(win)
+
+
+class StubLayout(object):
+    def configure(self, client, screen_rect):
+        pass
+
+
+class OldTiling(OldRuleMatchMixin, StubLayout):
+    pass
+
+
+class NewTiling(RuleMatchMixin, StubLayout):
+    pass
+
+
+class SimQtile(object):
+    def __init__(self):
+        self.pending = []
+
+    def call_soon(self, func, *args):
+        self.pending.append((func, args))
+
+    def run_pending(self):
+        while self.pending:
+            func, args = self.pending.pop(0)
+            func(*args)
+
+
+class SimGroup(object):
+    def __init__(self, qtile, layout, floating_layout):
+        self.qtile = qtile
+        self.layout = layout
+        self.floating_layout = floating_layout
+        self.windows = []
+        self.relayouts = 0
+
+    def add(self, win):
+        self.windows.append(win)
+        win.group = self
+        if self.floating_layout.match(win):
+            win._floating = True
+        self.layout_all()
+
+    def layout_all(self):
+        self.relayouts += 1
+        for win in [win for win in self.windows if not win.floating]:
+            self.layout.configure(win, None)
+
+    def mark_floating(self, win, floating):
+        self.layout_all()
+
+
+class SimWindow(object):
+    def __init__(self, qtile, wid, name, wm_class, floating=False):
+        self.qtile = qtile
+        self.wid = wid
+        self.name = name
+        self.wm_class = wm_class
+        self.group = None
+        self.fullscreen = False
+        self._floating = floating
+
+    @property
+    def floating(self):
+        return self._floating
+
+    @floating.setter
+    def floating(self, floating):
+        if floating != self._floating:
+            self._floating = floating
+            self.group.mark_floating(self, floating)
+
+    def get_wm_class(self):
+        return self.wm_class
+
+    def match(self, rule):
+        return rule.compare(self)
+
+    def bring_to_front(self):
+        pass
+
+
+class CountingMixin(object):
+    calls = 0
+
+    def match(self, win):
+        type(self).calls += 1
+        return super().match(win)
+
+
+def make_floating(floating_class):
+    counting = type(floating_class.__name__, (CountingMixin, floating_class), {})
+    counting.calls = 0
+    return counting(tiling_rules=[Match(wm_class='App')])
+
+
+def run_scenario(tiling_class, floating_class, windows_count, groups_count):
+    qtile = SimQtile()
+    floating_layout = make_floating(floating_class)
+    groups = [
+        SimGroup(qtile, tiling_class(), floating_layout)
+        for i in range(groups_count)]
+
+    for wid in range(windows_count):
+        group = groups[wid % groups_count]
+        if wid % 10 == 0:
+            win = SimWindow(qtile, wid, f'dialog {wid}', ['dialog', 'Dialog'])
+        else:
+            # transient dialogs are floated by qtile, whatever the rules say
+            win = SimWindow(qtile, wid, f'window {wid}', ['app', 'App'], floating=wid % 5 == 0)
+
+        group.add(win)
+        qtile.run_pending()
+
+        win.name += ' - loaded'
+        floating_layout._on_name_updated(win)
+        qtile.run_pending()
+
+        if wid % 10 == 0:
+            # tiled by hand
+            win.floating = False
+            qtile.run_pending()
+
+    relayouts = sum(group.relayouts for group in groups)
+    floating = [win.floating for group in groups for win in group.windows]
+    return relayouts, type(floating_layout).calls, floating
+
+
+def main(argv):
+    windows_count = int(argv[0]) if len(argv) > 0 else 30
+    groups_count = int(argv[1]) if len(argv) > 1 else 5
+    repeat = int(argv[2]) if len(argv) > 2 else 50
+
+    print(f'{windows_count} windows in {groups_count} groups, best of {repeat} runs')
+    for label, tiling_class, floating_class in (
+            ('old', OldTiling, OldFloating), ('new', NewTiling, Floating)):
+        relayouts, calls, floating = run_scenario(
+            tiling_class, floating_class, windows_count, groups_count)
+        best = min(timeit.repeat(
+            lambda: run_scenario(tiling_class, floating_class, windows_count, groups_count),
+            number=1, repeat=repeat))
+        print(f'{label}: {relayouts / windows_count:.2f} relayouts and '
+              f'{calls / windows_count:.2f} match calls per window open, '
+              f'{sum(floating)} floating, {best * 1000:.2f} ms per run')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
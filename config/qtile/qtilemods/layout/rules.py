@@ -0,0 +1,93 @@
+import re
+
+from libqtile.config import Match
+
+# properties a single rule can be reduced to a lookup for
+INDEXED = ('wm_class', 'wm_instance_class', 'title')
+NEVER = re.compile(r'(?!)')
+
+
+class CompiledRules(object):
+    """A list of Match rules evaluated as set lookups and combined regexes
+
+    Rules testing one of wm_class, wm_instance_class or title against an
+    exact string become hash set lookups, against a regex they are joined
+    into a single alternation per property. Every other rule is left to
+    ``Match.compare``.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.exact = {name: set() for name in INDEXED}
+        self.patterns = {name: [] for name in INDEXED}
+        self.generic = []
+
+        for rule in self.rules:
+            if not self._index(rule):
+                self.generic.append(rule)
+
+        self.regex = {}
+        for name, patterns in self.patterns.items():
+            regex = self._combine(patterns)
+            if regex is not None:
+                self.regex[name] = regex
+            else:
+                self.regex[name] = NEVER
+                self.generic.extend(
+                    Match(**{name: pattern}) for pattern in patterns)
+
+    def _index(self, rule):
+        if type(rule) is not Match or len(rule._rules) != 1:
+            return False
+
+        name, value = next(iter(rule._rules.items()))
+        if name not in INDEXED:
+            return False
+
+        if isinstance(value, str):
+            self.exact[name].add(value)
+        elif isinstance(value, re.Pattern):
+            self.patterns[name].append(value)
+        else:
+            return False
+        return True
+
+    @staticmethod
+    def _combine(patterns):
+        if not patterns:
+            return NEVER
+
+        flags = {pattern.flags for pattern in patterns}
+        if len(flags) > 1 or any(pattern.groups for pattern in patterns):
+            # groups would renumber, mixed flags do not combine
+            return None
+
+        try:
+            return re.compile(
+                '|'.join(f'(?:{pattern.pattern})' for pattern in patterns), flags.pop())
+        except re.error:
+            return None
+
+    def _test(self, name, value):
+        return value in self.exact[name] or bool(self.regex[name].match(value))
+
+    def matches(self, win, wm_class=None, title=None):
+        """Whether any rule matches, wm_class and title may be passed in"""
+        if wm_class is None:
+            wm_class = win.get_wm_class()
+        if title is None:
+            title = win.name
+
+        if wm_class:
+            if any(self._test('wm_class', value) for value in wm_class):
+                return True
+            if self._test('wm_instance_class', wm_class[0]):
+                return True
+
+        if title is not None and self._test('title', title):
+            return True
+
+        return any(win.match(rule) for rule in self.generic)
+
+    def __bool__(self):
+        return bool(self.rules)
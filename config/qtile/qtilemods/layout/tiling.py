@@ -2,9 +2,18 @@ from libqtile import layout
 
 
 class RuleMatchMixin(object):
+    """Float tiled clients the rules decided on, outside of the layout pass
+
+    The floating layout decides once per window on map and on name
+    changes, only windows it has not seen yet (e.g. after reload_config)
+    are decided from here.
+    """
+
     def configure(self, client, screen_rect):
         super().configure(client, screen_rect)
-        client.floating = client.group.floating_layout.match(client)
+        floating_layout = client.group.floating_layout
+        if not floating_layout.decided(client):
+            client.qtile.call_soon(floating_layout.apply, client)
 
 
 class Bsp(RuleMatchMixin, layout.Bsp):
@@ -0,0 +1,228 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import select
+
+from libqtile.log_utils import logger
+
+# snd_mixer_selem_channel_id_t, front left is also the mono channel
+SND_MIXER_SCHN_FRONT_LEFT = 0
+
+_lib = None
+
+
+class pollfd(ctypes.Structure):
+    _fields_ = [
+        ('fd', ctypes.c_int),
+        ('events', ctypes.c_short),
+        ('revents', ctypes.c_short),
+    ]
+
+
+def _get_lib():
+    global _lib
+
+    if _lib is None:
+        name = ctypes.util.find_library('asound')
+        if name is None:
+            raise OSError('libasound is not available')
+
+        lib = ctypes.CDLL(name)
+        p = ctypes.c_void_p
+        for func, argtypes in (
+            ('snd_mixer_open', [ctypes.POINTER(p), ctypes.c_int]),
+            ('snd_mixer_attach', [p, ctypes.c_char_p]),
+            ('snd_mixer_selem_register', [p, p, p]),
+            ('snd_mixer_load', [p]),
+            ('snd_mixer_close', [p]),
+            ('snd_mixer_handle_events', [p]),
+            ('snd_mixer_poll_descriptors_count', [p]),
+            ('snd_mixer_poll_descriptors', [p, ctypes.POINTER(pollfd), ctypes.c_uint]),
+            ('snd_mixer_selem_id_sizeof', []),
+            ('snd_mixer_selem_id_set_index', [p, ctypes.c_uint]),
+            ('snd_mixer_selem_id_set_name', [p, ctypes.c_char_p]),
+        ):
+            getattr(lib, func).argtypes = argtypes
+            getattr(lib, func).restype = ctypes.c_int
+
+        lib.snd_mixer_selem_id_set_index.restype = None
+        lib.snd_mixer_selem_id_set_name.restype = None
+        lib.snd_mixer_selem_id_sizeof.restype = ctypes.c_size_t
+        lib.snd_mixer_find_selem.argtypes = [p, p]
+        lib.snd_mixer_find_selem.restype = p
+
+        long_p = ctypes.POINTER(ctypes.c_long)
+        int_p = ctypes.POINTER(ctypes.c_int)
+        for direction in ('playback', 'capture'):
+            for func, argtypes in (
+                ('snd_mixer_selem_has_{}_volume', [p]),
+                ('snd_mixer_selem_has_{}_switch', [p]),
+                ('snd_mixer_selem_get_{}_volume_range', [p, long_p, long_p]),
+                ('snd_mixer_selem_get_{}_volume', [p, ctypes.c_int, long_p]),
+                ('snd_mixer_selem_get_{}_switch', [p, ctypes.c_int, int_p]),
+                ('snd_mixer_selem_set_{}_volume_all', [p, ctypes.c_long]),
+                ('snd_mixer_selem_set_{}_switch_all', [p, ctypes.c_int]),
+            ):
+                getattr(lib, func.format(direction)).argtypes = argtypes
+                getattr(lib, func.format(direction)).restype = ctypes.c_int
+
+        _lib = lib
+
+    return _lib
+
+
+def _check(result, func):
+    if result < 0:
+        raise OSError(-result, f'{func}: {os.strerror(-result)}')
+    return result
+
+
+class Element(object):
+    """Simple mixer element, playback unless it only has a capture volume"""
+
+    def __init__(self, mixer, elem, name):
+        self.mixer = mixer
+        self.elem = elem
+        self.name = name
+
+        lib = _get_lib()
+        self.direction = 'playback'
+        if (not lib.snd_mixer_selem_has_playback_volume(elem) and
+                lib.snd_mixer_selem_has_capture_volume(elem)):
+            self.direction = 'capture'
+
+        self.has_switch = bool(self._call('snd_mixer_selem_has_{}_switch'))
+        minimum, maximum = ctypes.c_long(), ctypes.c_long()
+        self._call('snd_mixer_selem_get_{}_volume_range', ctypes.byref(minimum), ctypes.byref(maximum))
+        self.min = minimum.value
+        self.max = maximum.value
+
+    def _call(self, func, *args):
+        func = func.format(self.direction)
+        return _check(getattr(_get_lib(), func)(self.elem, *args), func)
+
+    def get_volume(self):
+        """Volume in percents, rounded the way amixer shows it"""
+        value = ctypes.c_long()
+        self._call('snd_mixer_selem_get_{}_volume', SND_MIXER_SCHN_FRONT_LEFT, ctypes.byref(value))
+        if self.max <= self.min:
+            return 0
+        return round((value.value - self.min) * 100 / (self.max - self.min))
+
+    def set_volume(self, percent):
+        value = self.min + round(percent * (self.max - self.min) / 100)
+        self._call('snd_mixer_selem_set_{}_volume_all', value)
+
+    def is_muted(self):
+        if not self.has_switch:
+            return False
+
+        value = ctypes.c_int()
+        self._call('snd_mixer_selem_get_{}_switch', SND_MIXER_SCHN_FRONT_LEFT, ctypes.byref(value))
+        return not value.value
+
+    def set_muted(self, muted):
+        if self.has_switch:
+            self._call('snd_mixer_selem_set_{}_switch_all', int(not muted))
+
+    def toggle_mute(self):
+        self.set_muted(not self.is_muted())
+
+
+class Mixer(object):
+    """libasound simple mixer, change events are read from its poll descriptors"""
+
+    def __init__(self, device='default'):
+        lib = _get_lib()
+        self.device = device
+        self.handle = ctypes.c_void_p()
+        _check(lib.snd_mixer_open(ctypes.byref(self.handle), 0), 'snd_mixer_open')
+        try:
+            _check(lib.snd_mixer_attach(self.handle, device.encode()), 'snd_mixer_attach')
+            _check(lib.snd_mixer_selem_register(self.handle, None, None), 'snd_mixer_selem_register')
+            _check(lib.snd_mixer_load(self.handle), 'snd_mixer_load')
+        except OSError:
+            lib.snd_mixer_close(self.handle)
+            self.handle = None
+            raise
+
+        self._loop = None
+        self._fds = []
+        self._poll = None
+        self._callback = None
+        self._error_callback = None
+
+    def element(self, name, index=0):
+        lib = _get_lib()
+        sid = ctypes.create_string_buffer(lib.snd_mixer_selem_id_sizeof())
+        lib.snd_mixer_selem_id_set_index(sid, index)
+        lib.snd_mixer_selem_id_set_name(sid, name.encode())
+        elem = lib.snd_mixer_find_selem(self.handle, sid)
+        if not elem:
+            raise OSError(f'No mixer element "{name}" on {self.device}')
+        return Element(self, elem, name)
+
+    def _on_readable(self):
+        if self._poll is None:
+            return
+
+        for fd, revents in self._poll.poll(0):
+            if revents & (select.POLLERR | select.POLLHUP | select.POLLNVAL):
+                logger.warning(f'ALSA mixer {self.device} is gone, falling back to polling')
+                self._fail()
+                return
+
+        try:
+            _check(_get_lib().snd_mixer_handle_events(self.handle), 'snd_mixer_handle_events')
+        except OSError:
+            logger.exception(f'Cannot read ALSA mixer {self.device}:')
+            self._fail()
+            return
+
+        try:
+            self._callback()
+        except Exception:
+            logger.exception('ALSA mixer callback failed:')
+
+    def _fail(self):
+        error_callback = self._error_callback
+        self.close()
+        if error_callback is not None:
+            try:
+                error_callback()
+            except Exception:
+                logger.exception('ALSA mixer error callback failed:')
+
+    def start(self, callback, loop=None, error_callback=None):
+        """Call ``callback`` on changes, ``error_callback`` once the mixer is closed on an error"""
+        lib = _get_lib()
+        count = _check(lib.snd_mixer_poll_descriptors_count(self.handle),
+                       'snd_mixer_poll_descriptors_count')
+        fds = (pollfd * count)()
+        count = _check(lib.snd_mixer_poll_descriptors(self.handle, fds, count),
+                       'snd_mixer_poll_descriptors')
+
+        self._callback = callback
+        self._error_callback = error_callback
+        self._loop = loop or asyncio.get_event_loop()
+        self._fds = [fds[i].fd for i in range(count)]
+        self._poll = select.poll()
+        for i in range(count):
+            self._poll.register(fds[i].fd, fds[i].events)
+        for fd in self._fds:
+            self._loop.add_reader(fd, self._on_readable)
+
+    def close(self):
+        if self._loop is not None:
+            for fd in self._fds:
+                self._loop.remove_reader(fd)
+            self._loop = None
+            self._fds = []
+            self._poll = None
+        self._callback = None
+        self._error_callback = None
+
+        if self.handle:
+            _get_lib().snd_mixer_close(self.handle)
+            self.handle = None
@@ -0,0 +1,143 @@
+import asyncio
+
+from libqtile.log_utils import logger
+
+from . import dbus
+
+BLUEZ_SERVICE = 'org.bluez'
+BLUEZ_ADAPTER = 'org.bluez.Adapter1'
+BLUEZ_DEVICE = 'org.bluez.Device1'
+
+
+class BluezState(object):
+    """Adapters and devices of BlueZ kept up to date from D-Bus signals"""
+
+    def __init__(self):
+        self.adapters = {}
+        self.devices = {}
+        self.bus = None
+        self._receivers = []
+        self._subscribers = []
+        self._started = None
+
+    @property
+    def powered(self):
+        return any(adapter.get('Powered') for adapter in self.adapters.values())
+
+    @property
+    def connected_count(self):
+        return sum(1 for device in self.devices.values() if device.get('Connected'))
+
+    def subscribe(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            try:
+                callback()
+            except Exception:
+                logger.exception('BlueZ callback failed:')
+
+    async def start(self):
+        """Connect once, concurrent callers wait for the same start"""
+        if self._started is None or (self._started.done() and self._started.exception()):
+            self._started = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._started)
+
+    async def _start(self):
+        self.bus = await dbus.get_bus(dbus.BusType.SYSTEM)
+        self._receivers = [
+            await dbus.add_signal_receiver(
+                self.bus, self._on_interfaces_added, sender=BLUEZ_SERVICE,
+                interface=dbus.OBJECT_MANAGER_INTERFACE, member='InterfacesAdded'),
+            await dbus.add_signal_receiver(
+                self.bus, self._on_interfaces_removed, sender=BLUEZ_SERVICE,
+                interface=dbus.OBJECT_MANAGER_INTERFACE, member='InterfacesRemoved'),
+            await dbus.add_signal_receiver(
+                self.bus, self._on_properties_changed, sender=BLUEZ_SERVICE,
+                interface=dbus.PROPERTIES_INTERFACE, member='PropertiesChanged',
+                path_namespace='/org/bluez'),
+        ]
+
+        objects = await dbus.get_managed_objects(self.bus, BLUEZ_SERVICE)
+        self.adapters = {}
+        self.devices = {}
+        for path, interfaces in objects.items():
+            self._add(path, interfaces)
+        self._notify()
+
+    def stop(self):
+        for receiver in self._receivers:
+            receiver.stop()
+        self._receivers = []
+        self._started = None
+
+    def _add(self, path, interfaces):
+        if BLUEZ_ADAPTER in interfaces:
+            self.adapters[path] = dict(interfaces[BLUEZ_ADAPTER])
+        if BLUEZ_DEVICE in interfaces:
+            self.devices[path] = dict(interfaces[BLUEZ_DEVICE])
+
+    def _on_interfaces_added(self, message):
+        path, interfaces = message.body
+        self._add(path, dbus.unpack(interfaces))
+        self._notify()
+
+    def _on_interfaces_removed(self, message):
+        path, interfaces = message.body
+        if BLUEZ_ADAPTER in interfaces:
+            self.adapters.pop(path, None)
+        if BLUEZ_DEVICE in interfaces:
+            self.devices.pop(path, None)
+        self._notify()
+
+    def _on_properties_changed(self, message):
+        interface, changed, invalidated = message.body
+        if interface == BLUEZ_ADAPTER:
+            props = self.adapters.setdefault(message.path, {})
+        elif interface == BLUEZ_DEVICE:
+            props = self.devices.setdefault(message.path, {})
+        else:
+            return
+
+        # redraw only when the widget state may change
+        before = (self.powered, self.connected_count)
+        props.update(dbus.unpack(changed))
+        for name in invalidated:
+            props.pop(name, None)
+
+        if (self.powered, self.connected_count) != before:
+            self._notify()
+
+    async def wait_for_adapter(self, timeout=3):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self.adapters and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        return bool(self.adapters)
+
+    async def set_powered(self, powered, attempts=3):
+        for path in list(self.adapters):
+            for attempt in range(attempts):
+                try:
+                    await dbus.set_property(
+                        self.bus, BLUEZ_SERVICE, path, BLUEZ_ADAPTER, 'Powered', 'b', powered)
+                    break
+                except dbus.DBusError:
+                    # a just unblocked radio may not be ready yet
+                    if attempt == attempts - 1:
+                        logger.exception(f'Cannot power {path}:')
+                    else:
+                        await asyncio.sleep(0.2)
+
+
+# qtile re-executes this module on reload_config, keep the mirror
+try:
+    state
+except NameError:
+    state = BluezState()
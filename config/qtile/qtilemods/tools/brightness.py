@@ -0,0 +1,105 @@
+import asyncio
+import math
+import os
+import shlex
+import subprocess
+
+from libqtile.log_utils import logger
+
+from . import runner
+
+FRAME_INTERVAL = 1 / 60
+
+
+class BrightnessController(object):
+    """Brightness steps merged into writes of the net target
+
+    Steps arriving while a write is in flight only move the target, a
+    single task writes it once the previous write is done. Writable sysfs
+    is written in the executor, otherwise ``command`` runs once per burst.
+    With ``smooth`` the sysfs value is animated toward the target.
+    """
+
+    def __init__(self, brightness_file, max_value, command=None, owner=None,
+                 smooth=False, duration=0.2):
+        self.brightness_file = brightness_file
+        self.max_value = max_value
+        self.command = command
+        self.owner = owner
+        self.smooth = smooth
+        self.duration = duration
+        self.target = None
+        self.written = None
+        self.callback = None
+        self._task = None
+
+    @property
+    def busy(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def writable(self):
+        return os.access(self.brightness_file, os.W_OK)
+
+    def read(self):
+        with open(self.brightness_file) as f:
+            return int(f.read().strip())
+
+    def step(self, delta):
+        """Move the target by delta, returns the new target"""
+        if not self.busy:
+            try:
+                self.target = self.written = self.read()
+            except (OSError, ValueError):
+                logger.exception(f'Cannot read {self.brightness_file}:')
+                return None
+
+        self.set_target(self.target + delta)
+        return self.target
+
+    def set_target(self, value):
+        value = int(min(max(value, 0), self.max_value))
+        if value == self.target and not self.busy and value == self.written:
+            return
+
+        self.target = value
+        if self.callback is not None:
+            self.callback(value)
+        if not self.busy:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        writable = self.writable
+        while self.written != self.target:
+            value = self.target
+            if self.smooth and writable:
+                # retargeted on every frame, new steps keep it moving
+                frames = max(self.duration / FRAME_INTERVAL, 1)
+                diff = value - self.written
+                step = math.ceil(abs(diff) / frames)
+                if abs(diff) > step:
+                    value = self.written + math.copysign(step, diff)
+
+            try:
+                await self._write(int(value), writable)
+            except (OSError, subprocess.TimeoutExpired):
+                logger.exception('Cannot set brightness:')
+                return
+
+            self.written = int(value)
+            if value != self.target:
+                await asyncio.sleep(FRAME_INTERVAL)
+
+    async def _write(self, value, writable):
+        if writable:
+            def write():
+                with open(self.brightness_file, 'w') as f:
+                    f.write(str(value))
+
+            await asyncio.get_running_loop().run_in_executor(None, write)
+
+        elif self.command is not None:
+            await runner.run_call(shlex.split(self.command.format(value)), owner=self.owner)
+
+        else:
+            raise PermissionError(f'No write permission for {self.brightness_file}')
@@ -0,0 +1,133 @@
+import asyncio
+
+from libqtile.log_utils import logger
+
+try:
+    from dbus_fast import BusType, Message, MessageType, Variant
+    from dbus_fast.aio import MessageBus
+    from dbus_fast.errors import DBusError
+except ImportError:
+    from dbus_next import BusType, Message, MessageType, Variant
+    from dbus_next.aio import MessageBus
+    from dbus_next.errors import DBusError
+
+DBUS_SERVICE = 'org.freedesktop.DBus'
+DBUS_PATH = '/org/freedesktop/DBus'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+OBJECT_MANAGER_INTERFACE = 'org.freedesktop.DBus.ObjectManager'
+
+# qtile re-executes this module on reload_config, keep the connections
+try:
+    _buses
+except NameError:
+    _buses = {}
+
+
+def unpack(value):
+    """Plain python values out of (nested) variants"""
+    if isinstance(value, Variant):
+        return unpack(value.value)
+    elif isinstance(value, dict):
+        return {key: unpack(item) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [unpack(item) for item in value]
+    return value
+
+
+async def get_bus(bus_type=BusType.SYSTEM, address=None):
+    """Shared connection to a bus, reconnected when it was lost"""
+    key = address or bus_type
+    bus = _buses.get(key)
+    if bus is None or not bus.connected:
+        if address is not None:
+            bus = MessageBus(bus_address=address)
+        else:
+            bus = MessageBus(bus_type=bus_type)
+        _buses[key] = bus = await bus.connect()
+    return bus
+
+
+async def call(bus, service, path, interface, member, signature='', body=()):
+    reply = await bus.call(Message(
+        destination=service, path=path, interface=interface, member=member,
+        signature=signature, body=list(body)))
+
+    if reply.message_type == MessageType.ERROR:
+        raise DBusError(reply.error_name, reply.body[0] if reply.body else '', reply)
+    return reply.body
+
+
+async def get_all(bus, service, path, interface):
+    body = await call(
+        bus, service, path, PROPERTIES_INTERFACE, 'GetAll', 's', [interface])
+    return unpack(body[0])
+
+
+async def get_property(bus, service, path, interface, name):
+    body = await call(
+        bus, service, path, PROPERTIES_INTERFACE, 'Get', 'ss', [interface, name])
+    return unpack(body[0])
+
+
+async def set_property(bus, service, path, interface, name, signature, value):
+    await call(
+        bus, service, path, PROPERTIES_INTERFACE, 'Set', 'ssv',
+        [interface, name, Variant(signature, value)])
+
+
+async def get_managed_objects(bus, service, path='/'):
+    body = await call(bus, service, path, OBJECT_MANAGER_INTERFACE, 'GetManagedObjects')
+    return unpack(body[0])
+
+
+def _match_rule(**match):
+    return ','.join(f"{key}='{value}'" for key, value in match.items())
+
+
+class SignalReceiver(object):
+    """Signals of a bus matching a rule, handed to callback(message)
+
+    ``path_namespace`` is matched on the path prefix, every other key on
+    the message field of the same name.
+    """
+
+    def __init__(self, bus, callback, **match):
+        self.bus = bus
+        self.callback = callback
+        self.match = match
+        self.rule = _match_rule(type='signal', **match)
+
+    def _filter(self, message):
+        if message.message_type != MessageType.SIGNAL:
+            return
+
+        for key, value in self.match.items():
+            if key == 'path_namespace':
+                if message.path != value and not message.path.startswith(value + '/'):
+                    return
+            elif key == 'sender':
+                # signals carry the unique name of the service
+                continue
+            elif getattr(message, key, None) != value:
+                return
+
+        try:
+            self.callback(message)
+        except Exception:
+            logger.exception('D-Bus signal callback failed:')
+
+    async def start(self):
+        self.bus.add_message_handler(self._filter)
+        await call(self.bus, DBUS_SERVICE, DBUS_PATH, DBUS_SERVICE, 'AddMatch', 's', [self.rule])
+
+    def stop(self):
+        self.bus.remove_message_handler(self._filter)
+        if self.bus.connected:
+            asyncio.ensure_future(call(
+                self.bus, DBUS_SERVICE, DBUS_PATH, DBUS_SERVICE, 'RemoveMatch', 's', [self.rule]))
+
+
+async def add_signal_receiver(bus, callback, **match):
+    receiver = SignalReceiver(bus, callback, **match)
+    await receiver.start()
+    return receiver
@@ -0,0 +1,101 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+
+from libqtile.log_utils import logger
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# wd, mask, cookie, len; followed by a NUL padded name
+EVENT = struct.Struct('iIII')
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    return _libc
+
+
+class Inotify(object):
+    def __init__(self):
+        self._fd = _get_libc().inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        self._watches = {}
+        self._loop = None
+        self._callback = None
+
+    def fileno(self):
+        return self._fd
+
+    def add_watch(self, path, mask):
+        wd = _get_libc().inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+
+        self._watches[wd] = path
+        return wd
+
+    def read_events(self):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                path = self._watches.get(wd)
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                yield path, mask, os.fsdecode(name)
+
+    def _on_readable(self):
+        for path, mask, name in self.read_events():
+            try:
+                self._callback(path, mask, name)
+            except Exception:
+                logger.exception('Inotify callback failed:')
+
+    def start(self, callback, loop=None):
+        self._callback = callback
+        self._loop = loop or asyncio.get_event_loop()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def close(self):
+        if self._fd < 0:
+            return
+
+        if self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop = None
+
+        os.close(self._fd)
+        self._fd = -1
+        self._watches.clear()
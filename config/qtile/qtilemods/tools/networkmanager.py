@@ -0,0 +1,192 @@
+import asyncio
+
+from libqtile.log_utils import logger
+
+from . import dbus
+
+NM_SERVICE = 'org.freedesktop.NetworkManager'
+NM_PATH = '/org/freedesktop/NetworkManager'
+NM_INTERFACE = 'org.freedesktop.NetworkManager'
+ACTIVE_INTERFACE = 'org.freedesktop.NetworkManager.Connection.Active'
+WIRELESS_INTERFACE = 'org.freedesktop.NetworkManager.Device.Wireless'
+AP_INTERFACE = 'org.freedesktop.NetworkManager.AccessPoint'
+
+# active connection types as nmcli names them
+CONNECTION_TYPES = {
+    '802-11-wireless': 'wifi',
+    '802-3-ethernet': 'ethernet',
+}
+# seconds before a failed sync is retried
+RETRY_DELAY = 1
+
+
+class NetworkManagerState(object):
+    """Active connections, their types and the Wi-Fi strength from D-Bus signals"""
+
+    def __init__(self):
+        self.bus = None
+        self.active = {}
+        self.access_points = {}
+        self.strengths = {}
+        self._receivers = []
+        self._subscribers = []
+        self._started = None
+        self._sync_task = None
+        self._sync_pending = False
+
+    def subscribe(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            try:
+                callback()
+            except Exception:
+                logger.exception('NetworkManager callback failed:')
+
+    def connection_types(self):
+        types = []
+        for props in self.active.values():
+            ctype = props.get('Type', '')
+            types.append(CONNECTION_TYPES.get(ctype, ctype))
+        return tuple(types)
+
+    @property
+    def vpn(self):
+        return any(
+            props.get('Vpn') or props.get('Type') in ('vpn', 'wireguard')
+            for props in self.active.values())
+
+    @property
+    def signal(self):
+        """Strength of the active access point, -1 without Wi-Fi"""
+        for ap in self.access_points.values():
+            if ap in self.strengths:
+                return self.strengths[ap]
+        return -1
+
+    async def start(self):
+        """Connect once, concurrent callers wait for the same start"""
+        if self._started is None or (self._started.done() and self._started.exception()):
+            self._started = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._started)
+
+    async def _start(self):
+        self.bus = await dbus.get_bus(dbus.BusType.SYSTEM)
+        self._receivers = [
+            await dbus.add_signal_receiver(
+                self.bus, self._on_properties_changed, sender=NM_SERVICE,
+                interface=dbus.PROPERTIES_INTERFACE, member='PropertiesChanged',
+                path_namespace=NM_PATH),
+        ]
+        await self.sync()
+
+    def stop(self):
+        for receiver in self._receivers:
+            receiver.stop()
+        self._receivers = []
+        self._started = None
+
+    async def _get_all(self, path, interface):
+        try:
+            return await dbus.get_all(self.bus, NM_SERVICE, path, interface)
+        except dbus.DBusError:
+            # the object went away meanwhile
+            return None
+
+    async def sync(self):
+        paths = await dbus.get_property(
+            self.bus, NM_SERVICE, NM_PATH, NM_INTERFACE, 'ActiveConnections')
+
+        active = {}
+        access_points = {}
+        for path in paths:
+            props = await self._get_all(path, ACTIVE_INTERFACE)
+            if props is None:
+                continue
+
+            active[path] = props
+            if props.get('Type') != '802-11-wireless':
+                continue
+
+            for device in props.get('Devices', ()):
+                wireless = await self._get_all(device, WIRELESS_INTERFACE)
+                if wireless is not None:
+                    access_points[device] = wireless.get('ActiveAccessPoint', '/')
+
+        strengths = {}
+        for ap in access_points.values():
+            if ap == '/':
+                continue
+
+            props = await self._get_all(ap, AP_INTERFACE)
+            if props is not None:
+                strengths[ap] = props.get('Strength', 0)
+
+        self.active = active
+        self.access_points = access_points
+        self.strengths = strengths
+        self._notify()
+
+    def schedule_sync(self):
+        if self._sync_task is not None and not self._sync_task.done():
+            self._sync_pending = True
+            return
+
+        self._sync_task = asyncio.ensure_future(self._sync_loop())
+
+    async def _sync_loop(self):
+        while True:
+            self._sync_pending = False
+            try:
+                await self.sync()
+            except dbus.DBusError:
+                logger.exception('Cannot read NetworkManager state:')
+            except Exception:
+                # the mirror would stay stale until the next signal
+                logger.exception('NetworkManager sync failed, retrying:')
+                asyncio.get_running_loop().call_later(RETRY_DELAY, self.schedule_sync)
+                break
+
+            if not self._sync_pending:
+                break
+
+    def _on_properties_changed(self, message):
+        interface, changed, invalidated = message.body
+        path = message.path
+
+        if interface == NM_INTERFACE:
+            if 'ActiveConnections' in changed:
+                self.schedule_sync()
+
+        elif interface == ACTIVE_INTERFACE:
+            if path in self.active:
+                changed = dbus.unpack(changed)
+                self.active[path].update(changed)
+                if 'Devices' in changed:
+                    self.schedule_sync()
+                else:
+                    self._notify()
+
+        elif interface == WIRELESS_INTERFACE:
+            if path in self.access_points and 'ActiveAccessPoint' in changed:
+                self.schedule_sync()
+
+        elif interface == AP_INTERFACE:
+            if path in self.strengths and 'Strength' in changed:
+                strength = dbus.unpack(changed['Strength'])
+                if strength != self.strengths[path]:
+                    self.strengths[path] = strength
+                    self._notify()
+
+
+# qtile re-executes this module on reload_config, keep the mirror
+try:
+    state
+except NameError:
+    state = NetworkManagerState()
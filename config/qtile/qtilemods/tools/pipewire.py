@@ -0,0 +1,257 @@
+import asyncio
+import codecs
+import json
+import re
+import shutil
+
+from libqtile.log_utils import logger
+
+NODE = 'PipeWire:Interface:Node'
+DEVICE = 'PipeWire:Interface:Device'
+METADATA = 'PipeWire:Interface:Metadata'
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'\s*')
+
+
+def decode_stream(buffer):
+    """Decode the concatenated JSON arrays printed by ``pw-dump``
+
+    Returns the decoded values and the incomplete rest of the buffer.
+    """
+    values = []
+    pos = _whitespace.match(buffer).end()
+    while pos < len(buffer):
+        try:
+            value, pos = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            break
+
+        values.append(value)
+        pos = _whitespace.match(buffer, pos).end()
+
+    return values, buffer[pos:]
+
+
+def get_props(obj):
+    info = obj.get('info') or {}
+    return info.get('props') or obj.get('props') or {}
+
+
+class PipewireGraph(object):
+    """Mirror of the PipeWire objects kept up to date from ``pw-dump --monitor``"""
+
+    def __init__(self):
+        self.objects = {}
+        self.by_name = {}
+        self.by_class = {}
+        self.by_device = {}
+        self.metadata = {}
+        self.generation = 0
+        self.ready = False
+        self._subscribers = []
+        self._task = None
+        self._changed = None
+
+    def clear(self):
+        self.objects = {}
+        self.by_name = {}
+        self.by_class = {}
+        self.by_device = {}
+        self.metadata = {}
+        self.ready = False
+
+    def _index(self, obj):
+        props = get_props(obj)
+        if 'node.name' in props:
+            self.by_name[props['node.name']] = obj
+        if 'media.class' in props:
+            self.by_class.setdefault(props['media.class'], {})[obj['id']] = obj
+        if 'device.id' in props:
+            self.by_device.setdefault(props['device.id'], {})[obj['id']] = obj
+        if obj.get('type') == METADATA and 'metadata.name' in props:
+            self.metadata[props['metadata.name']] = obj.setdefault('metadata', {})
+
+    def _unindex(self, obj):
+        props = get_props(obj)
+        if self.by_name.get(props.get('node.name')) is obj:
+            del self.by_name[props['node.name']]
+        self.by_class.get(props.get('media.class'), {}).pop(obj['id'], None)
+        self.by_device.get(props.get('device.id'), {}).pop(obj['id'], None)
+        if obj.get('type') == METADATA:
+            self.metadata.pop(props.get('metadata.name'), None)
+
+    def _merge(self, current, obj):
+        for key, value in obj.items():
+            if key == 'info' and current.get('info'):
+                info = current['info']
+                for info_key, info_value in value.items():
+                    if info_key == 'params' and info_value and info.get('params'):
+                        info['params'].update(info_value)
+                    else:
+                        info[info_key] = info_value
+
+            elif key == 'metadata':
+                entries = current.setdefault('metadata', {})
+                for entry in value or ():
+                    entry_key = (entry.get('subject', 0), entry.get('key'))
+                    if entry.get('value') is None:
+                        entries.pop(entry_key, None)
+                    else:
+                        entries[entry_key] = entry.get('value')
+
+            else:
+                current[key] = value
+
+    def apply(self, objects):
+        for obj in objects:
+            obj_id = obj.get('id')
+            if obj_id is None:
+                continue
+
+            current = self.objects.get(obj_id)
+            if current is not None:
+                self._unindex(current)
+
+            # removed objects are dumped with a null info (or props)
+            if ('info' in obj and obj['info'] is None) or ('props' in obj and obj['props'] is None):
+                self.objects.pop(obj_id, None)
+                continue
+
+            if current is None:
+                current = self.objects[obj_id] = {'id': obj_id}
+            self._merge(current, obj)
+            self._index(current)
+
+        self.generation += 1
+        if self._changed is not None:
+            self._changed.set()
+
+        for callback in list(self._subscribers):
+            try:
+                callback()
+            except Exception:
+                logger.exception('PipeWire graph callback failed:')
+
+    def get_metadata(self, key, name='default', subject=0):
+        return self.metadata.get(name, {}).get((subject, key))
+
+    def nodes(self, media_class):
+        return sorted(self.by_class.get(media_class, {}).values(), key=lambda obj: obj['id'])
+
+    def default_node(self, media_class):
+        key = 'default.{}'.format(media_class.replace('/', '.').lower())
+        value = self.get_metadata(key)
+        if isinstance(value, dict):
+            return self.by_name.get(value.get('name'))
+
+    def resolve(self, channel, media_class):
+        if channel.startswith('@DEFAULT'):
+            return self.default_node(media_class)
+        if channel.isdigit():
+            return self.objects.get(int(channel))
+        return self.by_name.get(channel)
+
+    def node_volume(self, node):
+        """Volume in percents and mute state of a node, None if unknown"""
+        params = ((node or {}).get('info') or {}).get('params') or {}
+        for prop in params.get('Props') or ():
+            volumes = prop.get('channelVolumes')
+            if volumes:
+                # channel volumes are linear, wpctl shows them on a cubic scale
+                volume = round(max(volumes) ** (1 / 3) * 100)
+                return volume, bool(prop.get('mute'))
+
+    def subscribe(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    async def wait_for(self, predicate, timeout=1):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        if self._changed is None:
+            self._changed = asyncio.Event()
+
+        while not predicate():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return predicate()
+
+        return True
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return True
+
+        if shutil.which('pw-dump') is None:
+            logger.error('pw-dump is not available')
+            return False
+
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self._monitor()
+            # the PipeWire daemon went away, pw-dump exits with it
+            logger.warning('pw-dump exited, restarting')
+            await asyncio.sleep(1)
+
+    async def _monitor(self):
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                'pw-dump', '--monitor', '--no-colors',
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        except OSError:
+            logger.exception('Cannot run pw-dump:')
+            return
+
+        self.clear()
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        buffer = ''
+        try:
+            while True:
+                chunk = await proc.stdout.read(64 * 1024)
+                if not chunk:
+                    break
+
+                text = decoder.decode(chunk)
+                buffer += text
+                # top level arrays can only end in a chunk with a closing bracket
+                if ']' not in text:
+                    continue
+
+                values, buffer = decode_stream(buffer)
+                for value in values:
+                    self.ready = True
+                    self.apply(value if isinstance(value, list) else [value])
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+
+
+# qtile re-executes this module on reload_config, keep the running monitor
+try:
+    graph
+except NameError:
+    graph = PipewireGraph()
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import struct
+
+from libqtile.log_utils import logger
+
+from . import runner
+
+DEVICE_PATH = '/dev/rfkill'
+SYSFS_PATH = '/sys/class/rfkill'
+
+TYPES = {
+    'all': 0,
+    'wlan': 1,
+    'bluetooth': 2,
+    'uwb': 3,
+    'wimax': 4,
+    'wwan': 5,
+    'gps': 6,
+    'fm': 7,
+    'nfc': 8,
+}
+TYPE_NAMES = {value: key for key, value in TYPES.items()}
+
+OP_ADD = 0
+OP_DEL = 1
+OP_CHANGE = 2
+OP_CHANGE_ALL = 3
+
+# struct rfkill_event: idx, type, op, soft, hard; newer kernels append fields
+EVENT = struct.Struct('IBBBB')
+
+
+class RfkillMonitor(object):
+    """Block state of the radios kept in memory from /dev/rfkill events
+
+    Without access to /dev/rfkill the state is read from sysfs on demand.
+    Subscribers are called on the loop with the type name that changed.
+    """
+
+    def __init__(self):
+        self.devices = {}
+        self._fd = None
+        self._loop = None
+        self._subscribers = []
+
+    @property
+    def running(self):
+        return self._fd is not None
+
+    def start(self, loop=None):
+        if self.running:
+            return True
+
+        try:
+            self._fd = os.open(DEVICE_PATH, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError:
+            logger.exception(f'Cannot open {DEVICE_PATH}, reading {SYSFS_PATH}:')
+            return False
+
+        # the kernel starts with an ADD event per existing device
+        self.devices = {}
+        self._loop = loop or asyncio.get_event_loop()
+        self._loop.add_reader(self._fd, self._on_readable)
+        self._on_readable()
+        return True
+
+    def stop(self):
+        if self._fd is None:
+            return
+
+        self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self._loop = None
+
+    def read_events(self):
+        while True:
+            try:
+                # one event per read
+                data = os.read(self._fd, 64)
+            except BlockingIOError:
+                return
+
+            if len(data) < EVENT.size:
+                return
+            yield EVENT.unpack_from(data)
+
+    def _on_readable(self):
+        changed = set()
+        for idx, type_id, op, soft, hard in self.read_events():
+            if op == OP_DEL:
+                device = self.devices.pop(idx, None)
+                if device is not None:
+                    changed.add(device['type'])
+            elif op in (OP_ADD, OP_CHANGE):
+                self.devices[idx] = {'type': type_id, 'soft': bool(soft), 'hard': bool(hard)}
+                changed.add(type_id)
+
+        for type_id in changed:
+            self._notify(type_id)
+
+    def _notify(self, type_id):
+        for callback in list(self._subscribers):
+            try:
+                callback(TYPE_NAMES.get(type_id, str(type_id)))
+            except Exception:
+                logger.exception('rfkill callback failed:')
+
+    def subscribe(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+        self.start()
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def read_sysfs(self):
+        devices = {}
+        try:
+            names = os.listdir(SYSFS_PATH)
+        except OSError:
+            return devices
+
+        for name in names:
+            path = os.path.join(SYSFS_PATH, name)
+            try:
+                with open(os.path.join(path, 'type')) as f:
+                    type_name = f.read().strip()
+                with open(os.path.join(path, 'soft')) as f:
+                    soft = f.read().strip() == '1'
+                with open(os.path.join(path, 'hard')) as f:
+                    hard = f.read().strip() == '1'
+            except OSError:
+                continue
+
+            idx = int(name[len('rfkill'):]) if name[len('rfkill'):].isdigit() else name
+            devices[idx] = {'type': TYPES.get(type_name, -1), 'soft': soft, 'hard': hard}
+
+        return devices
+
+    def state(self, type_name):
+        """(hard, soft) block of a radio type, any device blocked counts"""
+        devices = self.devices if self.running else self.read_sysfs()
+        type_id = TYPES[type_name]
+
+        hard = soft = False
+        for device in list(devices.values()):
+            if device['type'] == type_id:
+                hard = hard or device['hard']
+                soft = soft or device['soft']
+        return hard, soft
+
+    def is_blocked(self, type_name):
+        return any(self.state(type_name))
+
+    def set_block(self, type_name, blocked, owner=None):
+        type_id = TYPES[type_name]
+        try:
+            fd = os.open(DEVICE_PATH, os.O_WRONLY | os.O_CLOEXEC)
+            try:
+                os.write(fd, EVENT.pack(0, type_id, OP_CHANGE_ALL, int(blocked), 0))
+            finally:
+                os.close(fd)
+        except OSError:
+            logger.warning(f'Cannot write {DEVICE_PATH}, running rfkill')
+            runner.spawn(['rfkill', 'block' if blocked else 'unblock', type_name], owner=owner)
+
+        # render at once, the kernel event confirms it
+        for device in self.devices.values():
+            if type_id in (0, device['type']):
+                device['soft'] = bool(blocked)
+        self._notify(type_id)
+
+    def toggle(self, type_name, owner=None):
+        blocked = self.state(type_name)[1]
+        self.set_block(type_name, not blocked, owner=owner)
+        return not blocked
+
+
+# qtile re-executes this module on reload_config, keep the open device
+try:
+    monitor
+except NameError:
+    monitor = RfkillMonitor()
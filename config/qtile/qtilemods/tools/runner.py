@@ -0,0 +1,201 @@
+import asyncio
+import concurrent.futures
+import subprocess
+import time
+
+from libqtile import qtile
+from libqtile.log_utils import logger
+
+MAX_CONCURRENCY = 4
+TIMEOUT = 5
+
+
+class Runner(object):
+    """Subprocesses of the widgets, run on the qtile event loop
+
+    Concurrency is capped, every command gets a timeout and identical
+    read-only commands that are already running share one fork. Forks and
+    wall time are accounted per owner (the widget name).
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, timeout=TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.stats = {}
+        self._inflight = {}
+        self._semaphore = None
+
+    def _get_stats(self, owner):
+        stats = self.stats.get(owner)
+        if stats is None:
+            stats = self.stats[owner] = {
+                'forks': 0, 'shared': 0, 'errors': 0, 'timeouts': 0,
+                'time': 0.0, 'max_time': 0.0,
+            }
+        return stats
+
+    def _account(self, owner, elapsed, returncode=0, timeout=False):
+        stats = self._get_stats(owner)
+        stats['forks'] += 1
+        stats['time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        if timeout:
+            stats['timeouts'] += 1
+        elif returncode:
+            stats['errors'] += 1
+
+    async def _spawn(self, cmd, owner, timeout, shell, stderr=False):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            start = time.monotonic()
+            stderr = subprocess.STDOUT if stderr else subprocess.DEVNULL
+            if shell:
+                proc = await asyncio.create_subprocess_shell(
+                    cmd, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE, stderr=stderr)
+            else:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE, stderr=stderr)
+
+            try:
+                stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                self._account(owner, time.monotonic() - start, timeout=True)
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            except asyncio.CancelledError:
+                if proc.returncode is None:
+                    proc.kill()
+                raise
+
+            self._account(owner, time.monotonic() - start, proc.returncode)
+            return proc.returncode, stdout.decode(errors='replace')
+
+    async def execute(self, cmd, owner=None, timeout=None, dedupe=True, shell=False, stderr=False):
+        """Run a command and return its (returncode, output)
+
+        Commands changing some state should pass ``dedupe=False``, with
+        ``stderr`` the error output is merged into the output.
+        """
+        timeout = timeout or self.timeout
+        key = (cmd if shell else tuple(cmd), shell, stderr)
+
+        future = self._inflight.get(key) if dedupe else None
+        if future is not None:
+            self._get_stats(owner)['shared'] += 1
+        else:
+            future = asyncio.ensure_future(self._spawn(cmd, owner, timeout, shell, stderr))
+            if dedupe:
+                self._inflight[key] = future
+                future.add_done_callback(lambda f: self._inflight.pop(key, None))
+
+        # a cancelled waiter must not kill the command shared with others
+        return await asyncio.shield(future)
+
+    def _execute_blocking(self, cmd, owner, timeout, shell, stderr=False):
+        start = time.monotonic()
+        try:
+            proc = subprocess.run(
+                cmd, shell=shell, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT if stderr else subprocess.DEVNULL, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._account(owner, time.monotonic() - start, timeout=True)
+            raise
+
+        self._account(owner, time.monotonic() - start, proc.returncode)
+        return proc.returncode, proc.stdout.decode(errors='replace')
+
+    def execute_sync(self, cmd, owner=None, timeout=None, dedupe=True, shell=False, stderr=False):
+        """Blocking flavour of ``execute`` for threads and legacy loop code"""
+        timeout = timeout or self.timeout
+        loop = getattr(qtile, '_eventloop', None)
+
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+
+        if loop is None or on_loop or not loop.is_running():
+            # the loop can not wait for itself, fork right here
+            return self._execute_blocking(cmd, owner, timeout, shell, stderr)
+
+        future = asyncio.run_coroutine_threadsafe(
+            self.execute(cmd, owner=owner, timeout=timeout, dedupe=dedupe,
+                         shell=shell, stderr=stderr), loop)
+        try:
+            return future.result(timeout + 1)
+        except concurrent.futures.TimeoutError:
+            # still queued behind the concurrency cap, fail like a timeout
+            future.cancel()
+            self._get_stats(owner)['timeouts'] += 1
+            raise subprocess.TimeoutExpired(cmd, timeout)
+
+    def get_stats(self, owner=None):
+        stats = self.stats if owner is None else {owner: self._get_stats(owner)}
+        return {
+            name: dict(values, time=round(values['time'], 3), max_time=round(values['max_time'], 3))
+            for name, values in stats.items()
+        }
+
+
+def _check(cmd, result):
+    returncode, output = result
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd, output)
+    return output
+
+
+async def run(cmd, owner=None, timeout=None, dedupe=True, shell=False):
+    """Output of a command, raises CalledProcessError on failure"""
+    return _check(cmd, await runner.execute(cmd, owner, timeout, dedupe, shell))
+
+
+async def run_call(cmd, owner=None, timeout=None, shell=False):
+    returncode, _ = await runner.execute(cmd, owner, timeout, False, shell)
+    return returncode
+
+
+def check_output(cmd, owner=None, timeout=None, dedupe=True, shell=False):
+    return _check(cmd, runner.execute_sync(cmd, owner, timeout, dedupe, shell))
+
+
+def getoutput(cmd, owner=None, timeout=None, dedupe=True, shell=False):
+    """Output of a command whatever its exit status, as subprocess.getoutput
+
+    Error output is merged in and one trailing newline is stripped.
+    """
+    _, output = runner.execute_sync(cmd, owner, timeout, dedupe, shell, stderr=True)
+    if output[-1:] == '\n':
+        output = output[:-1]
+    return output
+
+
+def call(cmd, owner=None, timeout=None, shell=False):
+    returncode, _ = runner.execute_sync(cmd, owner, timeout, False, shell)
+    return returncode
+
+
+def spawn(cmd, owner=None, timeout=None, shell=False, callback=None):
+    """Run a command from the event loop without waiting for it"""
+    async def run_spawned():
+        try:
+            returncode = await run_call(cmd, owner, timeout, shell)
+        except (OSError, subprocess.TimeoutExpired):
+            logger.exception(f'Cannot run {cmd}:')
+            return
+
+        if callback is not None:
+            callback(returncode)
+
+    return asyncio.ensure_future(run_spawned())
+
+
+# qtile re-executes this module on reload_config, keep the accounting
+try:
+    runner
+except NameError:
+    runner = Runner()
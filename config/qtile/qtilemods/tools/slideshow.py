@@ -0,0 +1,221 @@
+import asyncio
+import os
+from collections import OrderedDict
+
+import cairocffi
+import cairocffi.pixbuf
+from libqtile import qtile
+from libqtile.log_utils import logger
+
+from . import inotify
+
+SLIDESHOW_PATH = os.path.expanduser('~/Pictures/Slideshow')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+WATCH_MASK = (
+    inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO | inotify.IN_MOVED_FROM |
+    inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_ONLYDIR
+)
+
+
+def scale_image(path, width, height):
+    """Decode an image and scale it to fill width x height, runs in a thread"""
+    with open(path, 'rb') as f:
+        image, _ = cairocffi.pixbuf.decode_to_image_surface(f.read())
+
+    surface = cairocffi.ImageSurface(cairocffi.FORMAT_RGB24, width, height)
+    with cairocffi.Context(surface) as ctx:
+        image_w = image.get_width()
+        image_h = image.get_height()
+        # the placement of screen.paint(path, 'fill')
+        ratio = width / image_w
+        if ratio * image_h >= height:
+            ctx.scale(ratio)
+        else:
+            ratio = height / image_h
+            ctx.translate(-(image_w * ratio - width) // 2, 0)
+            ctx.scale(ratio)
+        ctx.set_source_surface(image)
+        ctx.paint()
+
+    surface.flush()
+    return surface
+
+
+class Slideshow(object):
+    """Wallpapers of a directory shown in turn on every screen
+
+    The directory is indexed once and kept up to date from inotify events.
+    The next image is decoded and scaled per screen geometry in the
+    executor, so showing it only blits a ready surface.
+    """
+
+    def __init__(self, path=SLIDESHOW_PATH, interval=300, cache_size=4):
+        self.path = path
+        self.interval = interval
+        self.cache_size = cache_size
+        self.images = []
+        self.index = -1
+        self.current = None
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._inotify = None
+        self._timer = None
+
+    def load(self):
+        images = []
+        for prefix, dirs, files in os.walk(self.path):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append(os.path.join(prefix, name))
+        self.images = sorted(images)
+
+    def watch(self):
+        if self._inotify is not None:
+            return
+
+        try:
+            self._inotify = inotify.Inotify()
+            for prefix, dirs, files in os.walk(self.path):
+                self._inotify.add_watch(prefix, WATCH_MASK)
+            self._inotify.start(self._on_event)
+        except (OSError, AttributeError):
+            logger.exception(f'Cannot watch {self.path}:')
+            self.unwatch()
+
+    def unwatch(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _on_event(self, path, mask, name):
+        if mask & inotify.IN_Q_OVERFLOW or (mask & inotify.IN_ISDIR and name):
+            # directories come and go with their images
+            self.unwatch()
+            self.load()
+            self.watch()
+            return
+
+        if path is None or not name.lower().endswith(IMAGE_EXTENSIONS):
+            return
+
+        filepath = os.path.join(path, name)
+        for key in [key for key in self._cache if key[0] == filepath]:
+            del self._cache[key]
+
+        if mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+            if filepath in self.images:
+                self.images.remove(filepath)
+        elif filepath not in self.images and not mask & inotify.IN_CREATE:
+            self.images.append(filepath)
+            self.images.sort()
+
+    def start(self, interval=None):
+        if interval is not None:
+            self.interval = interval
+        if self._timer is None:
+            self.load()
+            self.watch()
+        else:
+            self._timer.cancel()
+        self._on_timer()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.unwatch()
+
+    def _on_timer(self):
+        self._timer = asyncio.get_event_loop().call_later(self.interval, self._on_timer)
+        asyncio.ensure_future(self.next())
+
+    def _get_sizes(self):
+        return {(screen.width, screen.height) for screen in qtile.screens}
+
+    def prepare(self, path, size):
+        """Future of the scaled surface, shared by concurrent callers"""
+        key = (path, *size)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            future = asyncio.get_event_loop().create_future()
+            future.set_result(self._cache[key])
+            return future
+
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = qtile.run_in_executor(scale_image, path, *size)
+            future.add_done_callback(lambda f: self._on_prepared(key, f))
+        return future
+
+    def _on_prepared(self, key, future):
+        self._pending.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        self._cache[key] = future.result()
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def next(self):
+        if not self.images:
+            return
+
+        self.index = (self.index + 1) % len(self.images)
+        await self.show(self.images[self.index])
+
+        # get the following one ready meanwhile
+        if len(self.images) > 1:
+            path = self.images[(self.index + 1) % len(self.images)]
+            for size in self._get_sizes():
+                self.prepare(path, size)
+
+    async def refresh(self):
+        """Show the current image again, after the screens changed"""
+        if self.current is not None:
+            await self.show(self.current)
+
+    async def show(self, path):
+        self.current = path
+        if qtile.core.name != 'x11':
+            for screen in qtile.screens:
+                screen.paint(path, 'fill')
+            return
+
+        surfaces = {}
+        for size in self._get_sizes():
+            try:
+                surfaces[size] = await self.prepare(path, size)
+            except Exception:
+                logger.exception(f'Cannot load wallpaper {path}:')
+                return
+
+        if path != self.current:
+            # a newer one is on its way
+            return
+
+        try:
+            self.blit(surfaces)
+        except Exception:
+            logger.exception('Cannot paint wallpaper, falling back to screen.paint:')
+            for screen in qtile.screens:
+                screen.paint(path, 'fill')
+
+    def blit(self, surfaces):
+        painter = qtile.core.painter
+        for screen in qtile.screens:
+            image = surfaces[(screen.width, screen.height)]
+            root_pixmap, surface = painter._get_root_pixmap_and_surface(screen)
+            with cairocffi.Context(surface) as ctx:
+                ctx.translate(screen.x, screen.y)
+                ctx.set_source_surface(image)
+                ctx.paint()
+            surface.finish()
+            painter._update_root_pixmap(root_pixmap)
+
+
+# qtile re-executes this module on reload_config, keep the index and cache
+try:
+    slideshow
+except NameError:
+    slideshow = Slideshow()
@@ -0,0 +1,117 @@
+import asyncio
+import socket
+
+from libqtile.log_utils import logger
+
+NETLINK_KOBJECT_UEVENT = 15
+# kernel uevents, udev re-broadcasts its own on group 2
+KERNEL_GROUP = 1
+
+
+def parse(data):
+    """Environment of a kernel uevent: 'action@devpath' then KEY=VALUE fields"""
+    header, *fields = data.rstrip(b'\0').split(b'\0')
+    if b'@' not in header:
+        return None
+
+    event = {}
+    for field in fields:
+        key, sep, value = field.partition(b'=')
+        if sep:
+            event[key.decode(errors='replace')] = value.decode(errors='replace')
+    return event
+
+
+class UeventMonitor(object):
+    """Kernel uevents handed to callback(event) by subsystem
+
+    Nothing is read unless someone subscribed, the socket is opened with
+    the first subscriber.
+    """
+
+    def __init__(self):
+        self._sock = None
+        self._loop = None
+        self._subscribers = {}
+
+    @property
+    def running(self):
+        return self._sock is not None
+
+    def start(self, loop=None):
+        if self.running:
+            return True
+
+        try:
+            sock = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+                NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, KERNEL_GROUP))
+        except OSError:
+            logger.exception('Cannot listen to kernel uevents:')
+            return False
+
+        self._sock = sock
+        self._loop = loop or asyncio.get_event_loop()
+        self._loop.add_reader(sock.fileno(), self._on_readable)
+        return True
+
+    def stop(self):
+        if self._sock is None:
+            return
+
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        self._loop = None
+
+    def read_events(self):
+        while True:
+            try:
+                data = self._sock.recv(16 * 1024)
+            except BlockingIOError:
+                return
+            except OSError:
+                # ENOBUFS, events were dropped
+                logger.warning('Kernel uevents were dropped')
+                continue
+
+            event = parse(data)
+            if event is not None:
+                yield event
+
+    def _on_readable(self):
+        for event in self.read_events():
+            for callback in list(self._subscribers.get(event.get('SUBSYSTEM'), ())):
+                try:
+                    callback(event)
+                except Exception:
+                    logger.exception('uevent callback failed:')
+
+    def subscribe(self, subsystem, callback):
+        """Returns False when uevents can not be read"""
+        callbacks = self._subscribers.setdefault(subsystem, [])
+        added = callback not in callbacks
+        if added:
+            callbacks.append(callback)
+
+        if not self.start():
+            if added:
+                callbacks.remove(callback)
+            return False
+        return True
+
+    def unsubscribe(self, subsystem, callback):
+        callbacks = self._subscribers.get(subsystem, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+        if not any(self._subscribers.values()):
+            self.stop()
+
+
+# qtile re-executes this module on reload_config, keep the socket
+try:
+    monitor
+except NameError:
+    monitor = UeventMonitor()
@@ -0,0 +1,122 @@
+import asyncio
+
+from libqtile.log_utils import logger
+from libqtile.widget.battery import BatteryState, BatteryStatus, _Battery
+
+from . import dbus
+
+UPOWER_SERVICE = 'org.freedesktop.UPower'
+UPOWER_DEVICE = 'org.freedesktop.UPower.Device'
+# the composite battery UPower shows in desktop panels
+DISPLAY_DEVICE_PATH = '/org/freedesktop/UPower/devices/DisplayDevice'
+
+STATES = {
+    0: BatteryState.UNKNOWN,
+    1: BatteryState.CHARGING,
+    2: BatteryState.DISCHARGING,
+    3: BatteryState.EMPTY,
+    4: BatteryState.FULL,
+    5: BatteryState.NOT_CHARGING,
+    6: BatteryState.DISCHARGING,
+}
+
+
+class UPowerState(object):
+    """Properties of the UPower display device kept up to date from D-Bus signals"""
+
+    def __init__(self):
+        self.props = {}
+        self.bus = None
+        self._receivers = []
+        self._subscribers = []
+        self._started = None
+
+    @property
+    def status(self):
+        if not self.props.get('IsPresent'):
+            return None
+
+        state = STATES.get(self.props.get('State', 0), BatteryState.UNKNOWN)
+        if state == BatteryState.CHARGING:
+            time = self.props.get('TimeToFull', 0)
+        else:
+            time = self.props.get('TimeToEmpty', 0)
+
+        return BatteryStatus(
+            state=state,
+            percent=self.props.get('Percentage', 0) / 100,
+            power=self.props.get('EnergyRate', 0),
+            time=time,
+            charge_start_threshold=self.props.get('ChargeStartThreshold', 0),
+            charge_end_threshold=self.props.get('ChargeEndThreshold', 100),
+        )
+
+    def subscribe(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            try:
+                callback()
+            except Exception:
+                logger.exception('UPower callback failed:')
+
+    async def start(self):
+        """Connect once, concurrent callers wait for the same start"""
+        if self._started is None or (self._started.done() and self._started.exception()):
+            self._started = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._started)
+
+    async def _start(self):
+        self.bus = await dbus.get_bus(dbus.BusType.SYSTEM)
+        self._receivers = [
+            await dbus.add_signal_receiver(
+                self.bus, self._on_properties_changed, sender=UPOWER_SERVICE,
+                interface=dbus.PROPERTIES_INTERFACE, member='PropertiesChanged',
+                path=DISPLAY_DEVICE_PATH),
+        ]
+        self.props = await dbus.get_all(
+            self.bus, UPOWER_SERVICE, DISPLAY_DEVICE_PATH, UPOWER_DEVICE)
+        self._notify()
+
+    def stop(self):
+        for receiver in self._receivers:
+            receiver.stop()
+        self._receivers = []
+        self._started = None
+
+    def _on_properties_changed(self, message):
+        interface, changed, invalidated = message.body
+        if interface != UPOWER_DEVICE:
+            return
+
+        self.props.update(dbus.unpack(changed))
+        for name in invalidated:
+            self.props.pop(name, None)
+        self._notify()
+
+
+class UPowerBattery(_Battery):
+    """Battery reader over the mirrored UPower state, no I/O"""
+
+    def __init__(self, state):
+        self.state = state
+        self.force_charge = False
+
+    def update_status(self):
+        status = self.state.status
+        if status is None:
+            raise RuntimeError('No battery reported by UPower')
+        return status
+
+
+# qtile re-executes this module on reload_config, keep the mirror
+try:
+    state
+except NameError:
+    state = UPowerState()
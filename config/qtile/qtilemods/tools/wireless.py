@@ -0,0 +1,66 @@
+WIRELESS_PATH = '/proc/net/wireless'
+
+# cfg80211 reports the link quality out of 70
+MAX_QUALITY = 70
+# nl80211_xbm_to_percent() of NetworkManager: the noise floor is 30%
+NOISE_FLOOR_DBM = -90
+SIGNAL_MAX_DBM = -20
+
+
+def read_wireless(path=WIRELESS_PATH):
+    """Link quality per interface, only associated interfaces are listed
+
+    Returns None when the kernel does not provide the file.
+    """
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    interfaces = {}
+    # two header lines
+    for line in lines[2:]:
+        name, sep, rest = line.partition(':')
+        fields = rest.split()
+        if not sep or len(fields) < 4:
+            continue
+
+        try:
+            interfaces[name.strip()] = {
+                'status': fields[0],
+                'link': float(fields[1].rstrip('.')),
+                'level': float(fields[2].rstrip('.')),
+                'noise': float(fields[3].rstrip('.')),
+            }
+        except ValueError:
+            continue
+
+    return interfaces
+
+
+def to_percent(stats):
+    """Signal on the 0..100 scale nmcli shows"""
+    if stats['level'] < 0:
+        dbm = int(min(max(stats['level'], NOISE_FLOOR_DBM), SIGNAL_MAX_DBM))
+        percent = 100 - 70 * (SIGNAL_MAX_DBM - dbm) / (SIGNAL_MAX_DBM - NOISE_FLOOR_DBM)
+    else:
+        # no dBm from the driver, go by the link quality
+        percent = stats['link'] * 100 / MAX_QUALITY
+    return int(min(max(percent, 0), 100))
+
+
+def get_signal(interface=None, path=WIRELESS_PATH):
+    """Signal of an interface or the best associated one, -1 when offline
+
+    Returns None when the kernel does not provide the file.
+    """
+    interfaces = read_wireless(path)
+    if interfaces is None:
+        return None
+
+    if interface is not None:
+        stats = interfaces.get(interface)
+        return -1 if stats is None else to_percent(stats)
+
+    return max((to_percent(stats) for stats in interfaces.values()), default=-1)
@@ -0,0 +1,134 @@
+from libqtile import qtile
+from libqtile.log_utils import logger
+
+from . import runner
+
+RULES_NAMES = '_XKB_RULES_NAMES'
+USE_CORE_KBD = 0x100
+# xkb keymaps have at most four groups
+MAX_GROUPS = 4
+
+
+def split_options(options):
+    return tuple(option for option in (options or '').split(',') if option)
+
+
+class XkbState(object):
+    """Loaded xkb layouts and options, the keymap is reloaded only when needed
+
+    On X11 the keymap holds the configured layouts, so switching between
+    them locks a group and needs no fork. Elsewhere setxkbmap still runs,
+    but only when the layouts or options differ from the last loaded ones.
+    """
+
+    def __init__(self):
+        self.configured = ()
+        self.layouts = ()
+        self.options = ()
+        self.group = None
+        self._conn = None
+        self._xkb = None
+
+    def configure(self, keyboards):
+        """Layouts of the keymap, from the xkb:<layout>:... input methods"""
+        layouts = []
+        for keyboard in keyboards:
+            prefix, *var = keyboard.split(':')
+            if prefix == 'xkb' and var and var[0] not in layouts:
+                layouts.append(var[0])
+        self.configured = tuple(layouts)
+
+    def get_layouts(self, layout):
+        layouts = self.configured
+        if layout not in layouts:
+            layouts += (layout,)
+        if 'us' not in layouts:
+            layouts += ('us',)
+        if len(layouts) > MAX_GROUPS:
+            layouts = (layout,) if layout == 'us' else (layout, 'us')
+        return layouts
+
+    @property
+    def is_x11(self):
+        return qtile.core.name == 'x11'
+
+    def _get_xkb(self):
+        conn = qtile.core.conn.conn
+        if conn is not self._conn:
+            import xcffib.xkb
+            xkb = conn(xcffib.xkb.key)
+            xkb.UseExtension(1, 0).reply()
+            self._conn = conn
+            self._xkb = xkb
+        return self._xkb
+
+    def read(self):
+        """Layouts and options of the keymap from the root window, no fork"""
+        root = qtile.core.conn.default_screen.root
+        value = root.get_property(RULES_NAMES, 'STRING', unpack=str)
+        if not value:
+            return
+
+        # rules, model, layout, variant, options
+        names = value.split('\0') + [''] * 5
+        self.layouts = tuple(names[2].split(','))
+        self.options = split_options(names[4])
+        self.group = self._get_xkb().GetState(USE_CORE_KBD).reply().group
+
+    def lock_group(self, group):
+        if group == self.group:
+            return
+
+        self._get_xkb().LatchLockState(
+            USE_CORE_KBD, 0, 0, True, group, 0, False, 0)
+        qtile.core.conn.conn.flush()
+        self.group = group
+
+    def set_layout(self, layout, options=None, owner=None):
+        options = split_options(options)
+        if not self.is_x11:
+            # no group locking here, the layout goes first as it used to
+            layouts = (layout,) if layout == 'us' else (layout, 'us')
+            if layouts != self.layouts or not set(options) <= set(self.options):
+                self.load(layouts, options, owner=owner)
+            return
+
+        try:
+            # something else may have loaded a keymap meanwhile
+            self.read()
+        except Exception:
+            logger.exception('Cannot read the xkb state:')
+
+        layouts = self.get_layouts(layout)
+        if layouts == self.layouts and set(options) <= set(self.options):
+            self.lock_group(layouts.index(layout))
+            return
+
+        self.load(layouts, options, group=layouts.index(layout), owner=owner)
+
+    def load(self, layouts, options, group=None, owner=None):
+        command = ['setxkbmap', '-layout', ','.join(layouts)]
+        if options:
+            command += ['-option', ','.join(options)]
+
+        def on_loaded(returncode):
+            if returncode:
+                logger.error(f'Cannot load the {",".join(layouts)} keymap')
+                return
+
+            self.layouts = layouts
+            # setxkbmap adds options to the loaded ones
+            self.options = tuple(dict.fromkeys(self.options + options))
+            # a new keymap starts over at the first group
+            self.group = None
+            if group is not None:
+                self.lock_group(group)
+
+        runner.spawn(command, owner=owner, callback=on_loaded)
+
+
+# qtile re-executes this module on reload_config, keep the cached state
+try:
+    state
+except NameError:
+    state = XkbState()
@@ -1,13 +1,33 @@
 import re
-import os
 
-from libqtile import widget, images, qtile
+from libqtile import widget
 from libqtile.widget import base
 from libqtile.log_utils import logger
 
+from ..tools import dbus, uevent, upower
 from .mixins import IconTextMixin
 
 
+class CachedBattery(object):
+    """Battery reader remembering the last status it returned"""
+
+    def __init__(self, battery):
+        self.battery = battery
+        self.status = None
+
+    @property
+    def force_charge(self):
+        return self.battery.force_charge
+
+    @force_charge.setter
+    def force_charge(self, value):
+        self.battery.force_charge = value
+
+    def update_status(self):
+        self.status = self.battery.update_status()
+        return self.status
+
+
 class Battery(IconTextMixin, widget.Battery):
     icon_names = (
         'battery-000-charging-symbolic',
@@ -48,12 +68,53 @@ class Battery(IconTextMixin, widget.Battery):
         self.padding = config.get('padding', 0)
         self.padding_x = config.get('padding_x') or self.padding
         self.padding_y = config.get('padding_y') or self.padding
+        # 'upower' follows D-Bus signals, 'sysfs' reads power_supply on uevents
+        self.backend = config.get('backend', 'upower')
+        self.watching = False
         super().__init__(**config)
+        self._battery = CachedBattery(self._battery)
 
     def _configure(self, qtile_, bar_):
         super()._configure(qtile_, bar_)
         self.setup_images()
 
+    async def _config_async(self):
+        await super()._config_async()
+        if self.backend == 'upower':
+            try:
+                await upower.state.start()
+            except (OSError, dbus.DBusError):
+                logger.exception('Cannot connect to UPower, reading sysfs on uevents:')
+                self.backend = 'sysfs'
+            else:
+                self._battery.battery = upower.UPowerBattery(upower.state)
+                upower.state.subscribe(self.on_upower)
+                self.on_upower()
+                return
+
+        self.watching = uevent.monitor.subscribe('power_supply', self.on_uevent)
+
+    def finalize(self):
+        upower.state.unsubscribe(self.on_upower)
+        if self.watching:
+            uevent.monitor.unsubscribe('power_supply', self.on_uevent)
+            self.watching = False
+        super().finalize()
+
+    def on_upower(self):
+        # the status is in memory already
+        self.update(self.poll())
+
+    def on_uevent(self, event):
+        future = self.qtile.run_in_executor(self.poll)
+        future.add_done_callback(self._on_polled)
+
+    def _on_polled(self, future):
+        try:
+            self.update(future.result())
+        except Exception:
+            logger.exception('Cannot read battery status:')
+
     def get_icon_key(self, status):
         status_state = status.state
         status_level = status.percent * 100
@@ -90,7 +151,7 @@ class Battery(IconTextMixin, widget.Battery):
             old_width = self.layout.width
             self.text = text
 
-            status = self._battery.update_status()
+            status = self._battery.status or self._battery.update_status()
             icon = self.get_icon_key(status)
             self.current_icon = icon
 
@@ -99,14 +160,3 @@ class Battery(IconTextMixin, widget.Battery):
             else:
                 self.bar.draw()
 
-        images = []
-        for (prefix, dirs, files) in os.walk(os.path.expanduser('~/Pictures/Slideshow')):
-            for image in files:
-                if image.endswith('.png') or image.endswith('.jpg') or image.endswith('.jpeg'):
-                    images.append(os.path.join(prefix, image))
-
-        if not hasattr(self, 'image_index'):
-            self.image_index = 0
-        for screen in qtile.screens:
-            screen.paint(images[self.image_index], 'fill')
-        self.image_index = self.image_index + 1 if self.image_index < len(images) - 1 else 0
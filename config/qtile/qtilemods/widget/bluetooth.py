@@ -1,23 +1,24 @@
-import json
+import asyncio
 import re
 import os
-import subprocess
 
 from libqtile import bar, widget, images
 from libqtile.command.base import expose_command
 from libqtile.log_utils import logger
 from libqtile.widget import base
 
-from .mixins import IconTextMixin
+from ..tools import bluez, dbus, rfkill, runner
+from .mixins import IconTextMixin, RfkillMixin, RunnerMixin
 
 
-class Bluetooth(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
+class Bluetooth(RfkillMixin, RunnerMixin, IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
     icon_names = (
         'bluetooth-active-symbolic',
         'bluetooth-disabled-symbolic',
         'bluetooth-disconnected-symbolic',
         'bluetooth-hardware-disabled-symbolic',
     )
+    rfkill_type = 'bluetooth'
 
     def __init__(self, **config):
         # self.foreground = config.get('foreground', '#ffffff')
@@ -27,6 +28,8 @@ class Bluetooth(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
         self.images = {}
         self.signal = -3
         self.current_icon = 'bluetooth-hardware-disabled-symbolic'
+        # 'dbus' follows BlueZ signals, 'bluetoothctl' polls the command
+        self.backend = config.get('backend', 'dbus')
 
         base.ThreadPoolText.__init__(self, '', **config)
         self.add_defaults(base.PaddingMixin.defaults)
@@ -42,6 +45,33 @@ class Bluetooth(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
         base.ThreadPoolText._configure(self, qtile, pbar)
         self.setup_images()
 
+    def timer_setup(self):
+        if self.backend != 'dbus':
+            base.ThreadPoolText.timer_setup(self)
+
+    async def _config_async(self):
+        await super()._config_async()
+        if self.backend != 'dbus':
+            return
+
+        try:
+            await bluez.state.start()
+        except (OSError, dbus.DBusError):
+            logger.exception('Cannot connect to BlueZ, falling back to bluetoothctl:')
+            self.backend = 'bluetoothctl'
+            base.ThreadPoolText.timer_setup(self)
+            return
+
+        bluez.state.subscribe(self.on_bluez)
+        self.on_bluez()
+
+    def finalize(self):
+        bluez.state.unsubscribe(self.on_bluez)
+        super().finalize()
+
+    def on_bluez(self):
+        self.update(self.get_signal())
+
     def get_icon_key(self, signal):
         if signal <= -3:
             return 'bluetooth-hardware-disabled-symbolic'
@@ -61,36 +91,35 @@ class Bluetooth(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
 
     @expose_command()
     def block(self):
-        is_blocked = False
-
-        rfkill = json.loads(subprocess.check_output(['rfkill', '-J']).decode())
-        for dev in rfkill['rfkilldevices']:
-            if dev['type'] != 'bluetooth':
-                continue
-            if dev['hard'] == 'blocked' or dev['soft'] == 'blocked':
-                is_blocked = True
-                break
+        asyncio.create_task(self._block())
 
-        if is_blocked:
+    async def _block(self):
+        if rfkill.monitor.is_blocked('bluetooth'):
             logger.error('unblocking bluetooth')
-            subprocess.call(['rfkill', 'unblock', 'bluetooth'])
-            subprocess.call(['bluetoothctl', 'power', 'on'])
+            rfkill.monitor.set_block('bluetooth', False, owner=self.name)
+            if self.backend == 'dbus':
+                # the adapter comes back once the radio is unblocked
+                if await bluez.state.wait_for_adapter():
+                    await bluez.state.set_powered(True)
+            else:
+                await runner.run_call(['bluetoothctl', 'power', 'on'], owner=self.name)
         else:
             logger.error('blocking bluetooth')
-            subprocess.call(['bluetoothctl', 'power', 'off'])
-            subprocess.call(['rfkill', 'block', 'bluetooth'])
-
-        self.update(self.get_signal())
+            if self.backend == 'dbus':
+                await bluez.state.set_powered(False)
+            else:
+                await runner.run_call(['bluetoothctl', 'power', 'off'], owner=self.name)
+            rfkill.monitor.set_block('bluetooth', True, owner=self.name)
 
     def get_signal(self):
-        rfkill = json.loads(subprocess.check_output(['rfkill', '-J']).decode())
-        for dev in rfkill['rfkilldevices']:
-            if dev['type'] == 'bluetooth' and dev['hard'] == 'blocked':
-                return -3
-            elif dev['type'] == 'bluetooth' and dev['soft'] == 'blocked':
-                return -2
-
-        out = subprocess.check_output(['bluetoothctl', 'devices', 'Connected']).decode()
+        signal = self.get_rfkill_signal()
+        if signal is not None:
+            return signal
+
+        if self.backend == 'dbus':
+            return bluez.state.connected_count or -1
+
+        out = self.run_output(['bluetoothctl', 'devices', 'Connected'])
         devices_count = 0
         for line in out.split('\n'):
             if re.search(r'([A-Za-z0-9]{2}:){5}[A-Za-z0-9]{2}', line):
@@ -6,7 +6,9 @@ from libqtile import widget
 from libqtile.widget import base
 from libqtile.widget.backlight import BACKLIGHT_DIR, ChangeDirection
 from libqtile.command.base import expose_command
+from libqtile.log_utils import logger
 
+from ..tools import brightness, uevent
 from .mixins import IconTextMixin
 
 
@@ -22,6 +24,14 @@ class DisplayLight(IconTextMixin, base.PaddingMixin, widget.Backlight):
         self.icon_spacing = config.get('icon_spacing', 0)
         self.images = {}
         self.current_icon = self.icon_names[0]
+        # follow kernel uevents instead of polling update_interval
+        self.watch = config.get('watch', True)
+        self.watching = False
+        self._watch_tried = False
+        self.max_value = None
+        # animate sysfs writes toward the target
+        self.smooth = config.get('smooth', False)
+        self.controller = None
         if not config.get('backlight_name'):
             names = os.listdir(self.backlight_dir)
             if names:
@@ -62,10 +72,47 @@ class DisplayLight(IconTextMixin, base.PaddingMixin, widget.Backlight):
         super()._configure(qtile, bar)
         self.setup_images()
 
+    def timer_setup(self):
+        # the base class reschedules this method, subscribe only once
+        if self.watch and not self._watch_tried:
+            self._watch_tried = True
+            self.watching = uevent.monitor.subscribe('backlight', self.on_uevent)
+            if self.watching:
+                self.update(self.poll())
+                return
+        base.InLoopPollText.timer_setup(self)
+
+    def finalize(self):
+        if self.watching:
+            uevent.monitor.unsubscribe('backlight', self.on_uevent)
+            self.watching = False
+        super().finalize()
+
+    def get_controller(self):
+        if self.controller is None:
+            _, max_value = self._get_info()
+            self.controller = brightness.BrightnessController(
+                self.brightness_file, max_value, command=self.change_command,
+                owner=self.name, smooth=self.smooth)
+            self.controller.callback = self.show_brightness
+        return self.controller
+
+    def show_brightness(self, value):
+        self.update(self.format.format(percent=value / self.max_value))
+
+    def on_uevent(self, event):
+        if self.controller is not None and self.controller.busy:
+            # the target is on display already
+            return
+        if event.get('DEVPATH', '').endswith('/' + self.backlight_name):
+            self.update(self.poll())
+
     def _get_info(self):
         brightness = self._load_file(self.brightness_file)
-        max_value = self._load_file(self.max_brightness_file)
-        return brightness, max_value
+        if self.max_value is None:
+            # fixed for the device, read it once
+            self.max_value = self._load_file(self.max_brightness_file)
+        return brightness, self.max_value
 
     def poll(self):
         try:
@@ -92,13 +139,14 @@ class DisplayLight(IconTextMixin, base.PaddingMixin, widget.Backlight):
     def change_backlight(self, direction, step=None):
         if not step:
             step = self.step
-        if self._future and not self._future.done():
-            return
-        now, max_value = self._get_info()
-        new = now
         if direction is ChangeDirection.DOWN:
-            new = max(now - step, 0)
-        elif direction is ChangeDirection.UP:
-            new = min(now + step, max_value)
-        if new != now:
-            self._future = self.qtile.run_in_executor(self._change_backlight, new)
+            step = -step
+        elif direction is not ChangeDirection.UP:
+            return
+
+        try:
+            controller = self.get_controller()
+        except RuntimeError:
+            logger.exception('Cannot read brightness:')
+            return
+        controller.step(step)
@@ -1,11 +1,10 @@
 import cairocffi
 import copy
 import re
-import os
 
 from xdg.IconTheme import getIconPath
 
-from libqtile import bar, widget, images, qtile
+from libqtile import bar, hook, widget, images, qtile
 from libqtile.log_utils import logger
 from libqtile.notify import ClosedReason, notifier
 from libqtile.widget import base
@@ -13,7 +12,7 @@ from libqtile.widget import base
 from qtilemods.tools import shortcuts
 
 from .mixins import AppMixin, IconTextMixin
-from ..icon_theme import get_icon_path
+from .. import desktop_entry, icon_cache
 
 
 class App(object):
@@ -30,27 +29,34 @@ class PinnedApp(App):
         self.cmd = re.sub(r'%[A-Za-z]', '', self.cmd)
         self.cmd = re.sub(r'@@[A-Za-z]?', '', self.cmd)
         self.cmd = self.cmd.strip()
+        self.compile_matcher()
 
     def clone(self):
-        return PinnedApp(desktop=self.desktop, name=self.name, icon=self.icon, cmd=self.cmd)
+        app = copy.copy(self)
+        app.window = None
+        return app
+
+    def compile_matcher(self):
+        self._match_name = self.get_name()
+        self._match_wm_class = self.get_wm_class()
+        # a window class matches if it is the app name or a prefix
+        # of the desktop name or icon, every prefix is precomputed
+        desktop_name = self.get_name().lower()
+        icon = self.get_icon().lower()
+        self._match_classes = {self.name.lower()}
+        self._match_classes.update(desktop_name[:i] for i in range(len(desktop_name) + 1))
+        self._match_classes.update(icon[:i] for i in range(len(icon) + 1))
 
     def matches_window(self, window):
-        win_classes = window.get_wm_class() or []
-
-        if self.get_name() == window.name:
+        if self._match_name == window.name:
             return True
 
-        if self.get_wm_class() and self.get_wm_class() in win_classes:
+        win_classes = window.get_wm_class() or []
+        if self._match_wm_class and self._match_wm_class in win_classes:
             return True
 
         for cl in win_classes:
-            if self.name.lower() == cl.lower():
-                return True
-
-            if self.get_name().lower().startswith(cl.lower()):
-                return True
-
-            if self.get_icon().lower().startswith(cl.lower()):
+            if cl.lower() in self._match_classes:
                 return True
 
         return False
@@ -79,6 +85,20 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
         self.add_defaults(base.MarginMixin.defaults)
         self._notifications = {}
         self._icons_cache = {}
+        self._window_icons = {}
+        self._class_icons = {}
+        self._icons_generation = None
+        self._window_slots = {}
+        self._window_keys = {}
+        self._window_pids = {}
+        self._windows_by_pid = {}
+        self._windows_by_name = {}
+        self._windows_by_class = {}
+        self._badges_timer = None
+        self._apps = None
+        self._slots = None
+        self._slots_width = None
+        self._slots_offset = None
         self._box_end_positions = []
         self.markup = False
         self.clicked = None
@@ -90,7 +110,7 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
         self.add_callbacks({'Button3': lambda: self.select_window(run=True)})
 
         self._fallback_icon = None
-        icon = get_icon_path(
+        icon = icon_cache.lookup_icon(
             'application-x-executable',
             size=self.icon_size, theme=self.theme_path)
         if icon:
@@ -117,18 +137,15 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
             #         self.pinned.append(app)
 
             else:
-                for desktop_path, desktop in self.get_desktop_files():
-                    if os.path.basename(desktop_path) != f'{pinned_name}.desktop':
-                        continue
-
+                desktop_path, desktop = desktop_entry.catalog.get(pinned_name)
+                if desktop:
                     # cmd = desktop['Desktop Entry']['Exec']
                     # cmd = re.sub(r'%[A-Za-z]', '', cmd)
                     # app = PinnedApp(desktop=desktop, name=pinned_name, cmd=cmd)
                     app = PinnedApp(desktop=desktop, name=pinned_name)
-                    break
 
             if app:
-                icon = get_icon_path(
+                icon = icon_cache.lookup_icon(
                     app.desktop['Desktop Entry']['Icon'],
                     size=self.icon_size, theme=self.theme_path)
                 if icon:
@@ -136,6 +153,8 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
                     self.pinned.append(app)
 
     async def _config_async(self):
+        desktop_entry.catalog.watch()
+
         if notifier is None:
             return
 
@@ -149,26 +168,16 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
         if 'desktop-entry' in notification.hints:
             name = notification.hints['desktop-entry'].value
 
-        window = None
-        for app in self.windows:
-            if app.window:
-                if app.window.get_pid() == pid:
-                    window = app.window
-                    break
-
-                if app.window.name == name:
-                    window = app.window
-                    break
-
-                for cl in (app.window.get_wm_class() or []):
-                    if cl == name:
-                        window = app.window
-                        break
+        window = (
+            self._find_indexed(self._windows_by_pid, pid) or
+            self._find_indexed(self._windows_by_name, name) or
+            self._find_indexed(self._windows_by_class, name))
 
         if window:
             if window not in self._notifications:
                 self._notifications[window] = 0
             self._notifications[window] += 1
+            self.qtile.call_soon_threadsafe(self._schedule_badges)
 
         # logger.warning(notification)
         # logger.warning(notification.id)
@@ -180,6 +189,15 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
     def on_close(self, notification_id):
         pass
 
+    def _schedule_badges(self):
+        # a burst of notifications ends up in a single redraw
+        if self._badges_timer is None:
+            self._badges_timer = self.timeout_add(0.1, self._flush_badges)
+
+    def _flush_badges(self):
+        self._badges_timer = None
+        self.draw()
+
     def box_width(self, text):
         return 0
 
@@ -200,23 +218,173 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
 
     @property
     def windows(self):
-        pinned_apps = [app.clone() for app in self.pinned]
+        if self._apps is None:
+            self._apps = self._build_apps()
+        return self._apps
+
+    def _build_apps(self):
+        pinned_windows = [[] for app in self.pinned]
         unpinned_apps = []
 
-        for group in self.qtile.groups:
-            for window in group.windows:
-                for i, app in enumerate(pinned_apps):
-                    if app.matches_window(window):
-                        if app.window:
-                            app = app.clone()
-                            pinned_apps.insert(i + 1, app)
-                        app.window = window
-                        break
-                else:
-                    unpinned_apps.append(UnpinnedApp(window))
+        # the taskbar follows the order of the groups and of their windows
+        order = {window: i for i, window in enumerate(
+            window for group in self.qtile.groups for window in group.windows)}
+        slots = sorted(self._window_slots.items(), key=lambda item: order.get(item[0], len(order)))
+
+        for window, slot in slots:
+            if slot is None:
+                unpinned_apps.append(UnpinnedApp(window))
+            else:
+                pinned_windows[slot].append(window)
+
+        pinned_apps = []
+        for app, windows in zip(self.pinned, pinned_windows):
+            if not windows:
+                pinned_apps.append(app.clone())
+
+            for window in windows:
+                app = app.clone()
+                app.window = window
+                pinned_apps.append(app)
 
         return pinned_apps + unpinned_apps
 
+    def _match_window(self, window):
+        for i, app in enumerate(self.pinned):
+            if app.matches_window(window):
+                return i
+
+    def _find_indexed(self, index, key):
+        windows = index.get(key)
+        if windows:
+            return windows[0]
+
+    def _index(self, index, key, window):
+        index.setdefault(key, []).append(window)
+
+    def _unindex(self, index, key, window):
+        windows = index.get(key, [])
+        if window in windows:
+            windows.remove(window)
+        if not windows:
+            index.pop(key, None)
+
+    def _index_window(self, window):
+        # the pid does not change, read it once per window
+        pid = window.get_pid()
+        self._window_pids[window] = pid
+        if pid is not None:
+            self._index(self._windows_by_pid, pid, window)
+        self._index_names(window)
+
+    def _unindex_window(self, window):
+        pid = self._window_pids.pop(window, None)
+        if pid is not None:
+            self._unindex(self._windows_by_pid, pid, window)
+        self._unindex_names(window)
+
+    def _index_names(self, window):
+        keys = (
+            (self._windows_by_name, window.name),
+        ) + tuple((self._windows_by_class, cl) for cl in window.get_wm_class() or [])
+
+        keys = tuple((index, key) for index, key in keys if key is not None)
+        for index, key in keys:
+            self._index(index, key, window)
+        self._window_keys[window] = keys
+
+    def _unindex_names(self, window):
+        for index, key in self._window_keys.pop(window, ()):
+            self._unindex(index, key, window)
+
+    def _add_window(self, window):
+        if window in self._window_slots or getattr(window, 'group', None) is None:
+            return False
+
+        self._window_slots[window] = self._match_window(window)
+        self._index_window(window)
+        return True
+
+    def _remove_window(self, window):
+        self._unindex_window(window)
+        return self._window_slots.pop(window, False) is not False
+
+    def _sync_windows(self):
+        windows = [window for group in self.qtile.groups for window in group.windows]
+        changed = False
+
+        for window in set(self._window_slots) - set(windows):
+            changed = self._remove_window(window) or changed
+
+        for window in windows:
+            changed = self._add_window(window) or changed
+
+        return changed
+
+    def _on_model_changed(self, changed):
+        if changed:
+            self._apps = None
+            self.bar.draw()
+
+    def _on_client_managed(self, window):
+        self._on_model_changed(self._add_window(window))
+
+    def _on_client_killed(self, window):
+        self._on_model_changed(self._remove_window(window))
+
+    def _on_client_name_updated(self, window):
+        if window not in self._window_slots:
+            return
+
+        self._unindex_names(window)
+        self._index_names(window)
+
+        slot = self._match_window(window)
+        if slot != self._window_slots[window]:
+            self._window_slots[window] = slot
+            self._on_model_changed(True)
+
+    def _on_setgroup(self):
+        self._on_model_changed(self._sync_windows())
+
+    def _on_group_window_add(self, group, window):
+        # moved to another group, the order changes
+        self._on_model_changed(window in self._window_slots)
+
+    def _on_changegroup(self):
+        self._sync_windows()
+        self._on_model_changed(True)
+
+    def setup_hooks(self):
+        super().setup_hooks()
+        hook.subscribe.client_managed(self._on_client_managed)
+        hook.subscribe.client_killed(self._on_client_killed)
+        hook.subscribe.client_name_updated(self._on_client_name_updated)
+        hook.subscribe.setgroup(self._on_setgroup)
+        hook.subscribe.group_window_add(self._on_group_window_add)
+        hook.subscribe.changegroup(self._on_changegroup)
+
+        self._window_slots = {}
+        self._window_keys = {}
+        self._window_pids = {}
+        self._windows_by_pid = {}
+        self._windows_by_name = {}
+        self._windows_by_class = {}
+        self._sync_windows()
+        self._apps = None
+
+    def remove_hooks(self):
+        hook.unsubscribe.client_managed(self._on_client_managed)
+        hook.unsubscribe.client_killed(self._on_client_killed)
+        hook.unsubscribe.client_name_updated(self._on_client_name_updated)
+        hook.unsubscribe.setgroup(self._on_setgroup)
+        hook.unsubscribe.group_window_add(self._on_group_window_add)
+        hook.unsubscribe.changegroup(self._on_changegroup)
+
+    def finalize(self):
+        self.remove_hooks()
+        super().finalize()
+
     def select_window(self, run=False):
         if self.clicked:
             app = self.clicked
@@ -265,33 +433,39 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
         if isinstance(app, PinnedApp):
             return app.icon
 
+        if self._icons_generation != desktop_entry.catalog.generation:
+            self._icons_generation = desktop_entry.catalog.generation
+            self._window_icons.clear()
+            self._class_icons.clear()
+
         w = app.window
-        icon = super().get_window_icon(w)
-        if icon:
-            return icon
-
-        for cl in w.get_wm_class() or []:
-            # for appid, desktop in self.get_flatpaks():
-            #     name = desktop['Desktop Entry']['Name']
-            #     wmclass = desktop['Desktop Entry'].get('StartupWMClass')
-            #     if cl.lower() == name.lower() or cl.lower() == wmclass:
-            #         icon = desktop['Desktop Entry']['Icon']
-            #         surface = self.get_flatpak_icon(appid, desktop)
-            #         if surface:
-            #             self._icons_cache[w.wid] = surface
-            #             return surface
-
-            for desktop_path, desktop in self.get_desktop_files():
-                name = desktop['Desktop Entry']['Name']
-                wmclass = desktop['Desktop Entry'].get('StartupWMClass')
-                if cl.lower() == name.lower() or cl.lower() == wmclass:
-                    icon = desktop['Desktop Entry']['Icon']
-                    surface = self.get_icon_surface(icon, self.icon_size)
-                    if surface:
-                        self._icons_cache[w.wid] = surface
-                        return surface
-
-        return self._fallback_icon
+        if w.wid in self._window_icons:
+            return self._window_icons[w.wid]
+
+        icon = super().get_window_icon(w) or self.get_class_icon(w) or self._fallback_icon
+        self._window_icons[w.wid] = icon
+        return icon
+
+    def get_class_icon(self, window):
+        for cl in window.get_wm_class() or []:
+            key = cl.lower()
+            if key not in self._class_icons:
+                surface = None
+                desktop_path, desktop = desktop_entry.catalog.find_window_class(cl)
+                if desktop and 'Icon' in desktop['Desktop Entry']:
+                    icon = icon_cache.lookup_icon(
+                        desktop['Desktop Entry']['Icon'],
+                        size=self.icon_size, theme=self.theme_path)
+                    if icon:
+                        surface = self.get_icon_surface(icon, self.icon_size)
+                self._class_icons[key] = surface
+
+            if self._class_icons[key]:
+                return self._class_icons[key]
+
+    def remove_icon_cache(self, window):
+        super().remove_icon_cache(window)
+        self._window_icons.pop(window.wid, None)
 
     def drawbox(self, offset, text, bordercolor, textcolor,
                 width=None, rounded=False, block=False, icon=None, minimized=False):
@@ -336,8 +510,8 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
         self.drawer.ctx.paint()
         self.drawer.ctx.restore()
 
-    def draw(self):
-        self.drawer.clear(self.background or self.bar.background)
+    def get_slots(self):
+        slots = []
         offset = self.margin_x
 
         self._box_end_positions = []
@@ -367,20 +541,83 @@ class Dock(IconTextMixin, AppMixin, widget.TaskList):
             else:
                 border = None
 
-            textwidth = (
-                bw - 2 * self.padding_x - ((self.icon_size + self.padding_x) if icon else 0)
-            )
-            self.drawbox(
-                offset,
-                task,
-                border,
-                border,
-                rounded=self.rounded,
-                block=self.highlight_method == 'block',
-                width=textwidth,
-                icon=icon,
-                minimized=minimized
-            )
+            slots.append((offset, bw, icon, task, border, minimized))
             offset += bw + self.spacing
 
-        self.drawer.draw(offsetx=self.offset, offsety=self.offsety, width=self.width)
+        return slots
+
+    def draw_slot(self, slot, clear=False):
+        offset, bw, icon, task, border, minimized = slot
+        width = min(bw + self.spacing, self.width - offset)
+
+        self.drawer.ctx.save()
+        self.drawer.ctx.rectangle(offset, 0, width, self.bar.height)
+        self.drawer.ctx.clip()
+
+        if clear:
+            self.drawer.ctx.set_operator(cairocffi.OPERATOR_SOURCE)
+            self.drawer.set_source_rgb(self.background or self.bar.background)
+            self.drawer.ctx.paint()
+            self.drawer.ctx.set_operator(cairocffi.OPERATOR_OVER)
+
+        textwidth = (
+            bw - 2 * self.padding_x - ((self.icon_size + self.padding_x) if icon else 0)
+        )
+        self.drawbox(
+            offset,
+            task,
+            border,
+            border,
+            rounded=self.rounded,
+            block=self.highlight_method == 'block',
+            width=textwidth,
+            icon=icon,
+            minimized=minimized
+        )
+        self.drawer.ctx.restore()
+
+    def blit_slots(self, first, last):
+        offset = first[0]
+        width = min(last[0] + last[1] + self.spacing, self.width) - offset
+        self.drawer.draw(
+            offsetx=self.offset + offset, offsety=self.offsety, width=width, src_x=offset)
+
+    def draw(self):
+        slots = self.get_slots()
+        is_x11 = self.qtile.core.name == 'x11'
+
+        full = (
+            self._slots is None or
+            len(slots) != len(self._slots) or
+            self._slots_width != self.width or
+            # moved along the bar, the area there is stale
+            self._slots_offset != self.offset
+        )
+        damaged = [] if full else [
+            i for i, slot in enumerate(slots) if slot != self._slots[i]]
+        self._slots = slots
+        self._slots_width = self.width
+        self._slots_offset = self.offset
+
+        # x11 keeps the previous frame in a pixmap, other backends repaint
+        # from the recorded operations only
+        if full or (not damaged and not is_x11):
+            self.drawer.clear(self.background or self.bar.background)
+            for slot in slots:
+                self.draw_slot(slot)
+            self.drawer.draw(offsetx=self.offset, offsety=self.offsety, width=self.width)
+
+        elif not damaged:
+            self.drawer.draw(offsetx=self.offset, offsety=self.offsety, width=self.width)
+
+        elif is_x11:
+            for i in damaged:
+                self.draw_slot(slots[i], clear=True)
+            for i in damaged:
+                self.blit_slots(slots[i], slots[i])
+
+        else:
+            span = slots[damaged[0]:damaged[-1] + 1]
+            for slot in span:
+                self.draw_slot(slot, clear=True)
+            self.blit_slots(span[0], span[-1])
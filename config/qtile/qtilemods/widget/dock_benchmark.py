@@ -0,0 +1,112 @@
+"""Micro-benchmark of the PinnedApp window matcher
+
+Compares PinnedApp.matches_window, which uses the matcher built by
+compile_matcher, with the per-window matching it replaced. Run from
+the qtile config directory:
+
+    python -m qtilemods.widget.dock_benchmark [windows] [apps] [repeat]
+"""
+import random
+import string
+import sys
+import timeit
+
+from .dock import PinnedApp
+
+
+class FakeWindow(object):
+    def __init__(self, name, wm_class):
+        self.name = name
+        self.wm_class = wm_class
+
+    def get_wm_class(self):
+        return self.wm_class
+
+
+def old_matches_window(app, window):
+    """PinnedApp.matches_window before compile_matcher"""
+    win_classes = window.get_wm_class() or []
+
+    if app.get_name() == window.name:
+        return True
+
+    if app.get_wm_class() and app.get_wm_class() in win_classes:
+        return True
+
+    for cl in win_classes:
+        if app.name.lower() == cl.lower():
+            return True
+
+        if app.get_name().lower().startswith(cl.lower()):
+            return True
+
+        if app.get_icon().lower().startswith(cl.lower()):
+            return True
+
+    return False
+
+
+def new_matches_window(app, window):
+    return app.matches_window(window)
+
+
+def random_word(rnd, length):
+    return ''.join(rnd.choice(string.ascii_lowercase) for i in range(length))
+
+
+def make_apps(rnd, count):
+    apps = []
+    for i in range(count):
+        name = random_word(rnd, 8)
+        entry = {
+            'Name': name.capitalize() + ' ' + random_word(rnd, 6),
+            'Icon': 'org.example.' + name,
+            'Exec': name + ' %U',
+        }
+        if i % 2:
+            entry['StartupWMClass'] = name.capitalize()
+        apps.append(PinnedApp({'Desktop Entry': entry}, name))
+    return apps
+
+
+def make_windows(rnd, apps, count):
+    windows = []
+    for i in range(count):
+        if i % 3 == 0:
+            # one of the pinned apps
+            app = rnd.choice(apps)
+            wm_class = [app.name, app.name.capitalize()]
+        else:
+            name = random_word(rnd, 8)
+            wm_class = [name, name.capitalize()]
+        windows.append(FakeWindow(random_word(rnd, 24), wm_class))
+    return windows
+
+
+def run_pass(matcher, apps, windows):
+    return [[matcher(app, window) for app in apps] for window in windows]
+
+
+def main(argv):
+    windows_count = int(argv[0]) if len(argv) > 0 else 300
+    apps_count = int(argv[1]) if len(argv) > 1 else 12
+    repeat = int(argv[2]) if len(argv) > 2 else 50
+
+    rnd = random.Random(0)
+    apps = make_apps(rnd, apps_count)
+    windows = make_windows(rnd, apps, windows_count)
+
+    if run_pass(old_matches_window, apps, windows) != run_pass(new_matches_window, apps, windows):
+        print('The matchers disagree')
+        return 1
+
+    print(f'{windows_count} windows, {apps_count} pinned apps, best of {repeat} passes')
+    for label, matcher in (('old', old_matches_window), ('new', new_matches_window)):
+        best = min(timeit.repeat(
+            lambda: run_pass(matcher, apps, windows), number=1, repeat=repeat))
+        print(f'{label}: {best * 1000:.2f} ms per pass')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,7 +1,9 @@
+import asyncio
+import os
 import subprocess
 import time
 
-from subprocess import CalledProcessError, check_output
+from subprocess import CalledProcessError
 
 from libqtile import widget
 from libqtile.widget import base
@@ -9,22 +11,84 @@ from libqtile.widget.keyboardlayout import _BaseLayoutBackend
 from libqtile.command.base import expose_command
 from libqtile.log_utils import logger
 
+from ..tools import dbus, runner, xkb
+from .mixins import RunnerMixin
+
+IBUS_SERVICE = 'org.freedesktop.IBus'
+IBUS_PATH = '/org/freedesktop/IBus'
+IBUS_INTERFACE = 'org.freedesktop.IBus'
+IBUS_BUS_PATH = os.path.expanduser('~/.config/ibus/bus')
+
+FCITX_SERVICE = 'org.fcitx.Fcitx5'
+FCITX_PATH = '/controller'
+FCITX_INTERFACE = 'org.fcitx.Fcitx.Controller1'
+
+
+def set_xkb_layout(layout, options, owner=None):
+    prefix, *var = layout.split(':')
+    if prefix == 'xkb':
+        xkb.state.set_layout(var[0], options, owner=owner)
+
+
+def get_ibus_address():
+    """Address of the private bus of ibus-daemon for this display"""
+    address = os.environ.get('IBUS_ADDRESS')
+    if address:
+        return address
+
+    machine_id = None
+    for path in ('/etc/machine-id', '/var/lib/dbus/machine-id'):
+        try:
+            with open(path) as f:
+                machine_id = f.read().strip()
+            break
+        except OSError:
+            continue
+
+    display = os.environ.get('DISPLAY')
+    if display:
+        host, _, number = display.partition(':')
+        name = f'{machine_id}-{host or "unix"}-{number.split(".")[0]}'
+    else:
+        name = f'{machine_id}-unix-{os.environ.get("WAYLAND_DISPLAY", "wayland-0")}'
+
+    paths = [os.path.join(IBUS_BUS_PATH, name)]
+    try:
+        # the newest one when the display does not match
+        paths += sorted(
+            (os.path.join(IBUS_BUS_PATH, fn) for fn in os.listdir(IBUS_BUS_PATH)),
+            key=os.path.getmtime, reverse=True)
+    except OSError:
+        pass
+
+    for path in paths:
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith('IBUS_ADDRESS='):
+                        return line.strip().partition('=')[2]
+        except OSError:
+            continue
+
+    raise OSError('ibus-daemon is not running')
+
 
 class IBUSBackend(_BaseLayoutBackend):
+    owner = None
     transitional_keyboard = 'xkb:us::eng'
 
     def start_daemon(self):
-        subprocess.call([
+        runner.call([
             'ibus-daemon',
             '-dxrR',
             '-p', '/usr/lib64/gtk-4.0/4.0.0/immodules/libim-ibus.so',
-        ])
+        ], owner=self.owner)
 
     def get_keyboard(self) -> str:
         command = ['ibus', 'engine']
         try:
-            output = check_output(command).decode()
-        except CalledProcessError:
+            output = runner.check_output(command, owner=self.owner)
+        except (CalledProcessError, subprocess.TimeoutExpired):
             pass
         except OSError:
             logger.exception('Please, check that ibus is available')
@@ -38,40 +102,29 @@ class IBUSBackend(_BaseLayoutBackend):
 
         command = ['ibus', 'engine', layout]
         try:
-            check_output(command)
-        except CalledProcessError:
+            runner.check_output(command, owner=self.owner, dedupe=False)
+        except (CalledProcessError, subprocess.TimeoutExpired):
             pass
         except OSError:
             logger.error('Please, check that ibus is available:')
 
-        prefix, *var = layout.split(':')
-        if prefix == 'xkb':
-            layouts = [var[0]]
-            if 'us' not in layouts:
-                layouts.append('us')
-            command = ['setxkbmap', '-layout', ','.join(layouts)]
-            if options:
-                command += ['-option', options]
-            try:
-                check_output(command)
-            except CalledProcessError:
-                pass
-            except OSError:
-                logger.error('Please, check that setxkbmap is available')
+        set_xkb_layout(layout, options, self.owner)
 
 
 
 class FCITXBackend(_BaseLayoutBackend):
+    owner = None
+
     def start_daemon(self):
-        subprocess.call([
+        runner.call([
             'fcitx5', '-d',
-        ])
+        ], owner=self.owner)
 
     def get_keyboard(self) -> str:
         command = ['fcitx5-remote', '-q']
         try:
-            output = check_output(command).decode()
-        except CalledProcessError:
+            output = runner.check_output(command, owner=self.owner)
+        except (CalledProcessError, subprocess.TimeoutExpired):
             pass
         except OSError:
             logger.exception('Please, check that fcitx is available')
@@ -82,27 +135,144 @@ class FCITXBackend(_BaseLayoutBackend):
     def set_keyboard(self, layout, options):
         command = ['fcitx5-remote', '-g', layout]
         try:
-            check_output(command)
-        except CalledProcessError:
+            runner.check_output(command, owner=self.owner, dedupe=False)
+        except (CalledProcessError, subprocess.TimeoutExpired):
             pass
         except OSError:
             logger.error('Please, check that fcitx is available')
 
-        prefix, *var = layout.split(':')
-        if prefix == 'xkb':
-            layouts = [var[0]]
-            if 'us' not in layouts:
-                layouts.append('us')
-            command = ['setxkbmap', '-layout', ','.join(layouts)]
-            if options:
-                command += ['-option', options]
+        set_xkb_layout(layout, options, self.owner)
+
+
+
+class DBusBackendMixin(object):
+    """Current input method followed over D-Bus, switched with one call
+
+    ``get_keyboard`` returns the cached input method, ``refresh`` reads it
+    again in the background and ``callback`` is called when it changes.
+    Backends provide ``read_keyboard`` and ``switch``.
+    """
+
+    def __init__(self, qtile):
+        super().__init__(qtile)
+        self.bus = None
+        self.keyboard = '?'
+        self.callback = None
+        self._receivers = []
+        self._refreshing = None
+
+    async def get_bus(self):
+        return await dbus.get_bus(dbus.BusType.SESSION)
+
+    async def add_receivers(self):
+        return []
+
+    async def start(self, callback=None):
+        self.stop()
+        self.callback = callback or self.callback
+        self.bus = await self.get_bus()
+        self._receivers = await self.add_receivers()
+        self._set_current(await self.read_keyboard())
+
+    def stop(self):
+        for receiver in self._receivers:
+            receiver.stop()
+        self._receivers = []
+
+    def start_daemon(self):
+        super().start_daemon()
+        asyncio.ensure_future(self._restart())
+
+    async def _restart(self, attempts=10):
+        for attempt in range(attempts):
+            # the daemon needs a moment to own its name
+            await asyncio.sleep(0.5)
             try:
-                check_output(command)
-            except CalledProcessError:
-                pass
-            except OSError:
-                logger.error('Please, check that setxkbmap is available')
+                await self.start()
+                return
+            except (OSError, dbus.DBusError):
+                if attempt == attempts - 1:
+                    logger.exception('Cannot connect to the input method:')
+
+    def _set_current(self, keyboard):
+        if keyboard != self.keyboard:
+            self.keyboard = keyboard
+            if self.callback is not None:
+                self.callback()
+
+    def get_keyboard(self) -> str:
+        return self.keyboard
+
+    def refresh(self):
+        if self.bus is None or (self._refreshing is not None and not self._refreshing.done()):
+            return
+        self._refreshing = asyncio.ensure_future(self._refresh())
 
+    async def _refresh(self):
+        try:
+            self._set_current(await self.read_keyboard())
+        except (OSError, dbus.DBusError):
+            logger.exception('Cannot read the input method:')
+
+    def set_keyboard(self, layout, options):
+        self._set_current(layout)
+        asyncio.ensure_future(self._switch(layout))
+
+        set_xkb_layout(layout, options, self.owner)
+
+    async def _switch(self, layout):
+        try:
+            await self.switch(layout)
+        except (OSError, dbus.DBusError):
+            logger.exception(f'Cannot switch the input method to {layout}:')
+            self.refresh()
+
+
+class IBUSDBusBackend(DBusBackendMixin, IBUSBackend):
+    async def get_bus(self):
+        return await dbus.get_bus(address=get_ibus_address())
+
+    async def add_receivers(self):
+        return [
+            await dbus.add_signal_receiver(
+                self.bus, self._on_engine_changed,
+                interface=IBUS_INTERFACE, member='GlobalEngineChanged'),
+        ]
+
+    def _on_engine_changed(self, message):
+        self._set_current(message.body[0])
+
+    async def read_keyboard(self):
+        # IBusEngineDesc: type name, attachments, then the engine name
+        desc = await dbus.get_property(
+            self.bus, IBUS_SERVICE, IBUS_PATH, IBUS_INTERFACE, 'GlobalEngine')
+        return desc[2]
+
+    async def switch(self, layout):
+        await dbus.call(
+            self.bus, IBUS_SERVICE, IBUS_PATH, IBUS_INTERFACE,
+            'SetGlobalEngine', 's', [layout])
+
+
+class FCITXDBusBackend(DBusBackendMixin, FCITXBackend):
+    async def add_receivers(self):
+        # the controller has no signal for the current input method,
+        # group changes are re-read and tick refreshes the rest
+        return [
+            await dbus.add_signal_receiver(
+                self.bus, lambda message: self.refresh(), sender=FCITX_SERVICE,
+                interface=FCITX_INTERFACE, member='InputMethodGroupsChanged'),
+        ]
+
+    async def read_keyboard(self):
+        body = await dbus.call(
+            self.bus, FCITX_SERVICE, FCITX_PATH, FCITX_INTERFACE, 'CurrentInputMethod')
+        return body[0]
+
+    async def switch(self, layout):
+        await dbus.call(
+            self.bus, FCITX_SERVICE, FCITX_PATH, FCITX_INTERFACE,
+            'SetCurrentIM', 's', [layout])
 
 
 BACKENDS = {
@@ -110,8 +280,13 @@ BACKENDS = {
     'fcitx': FCITXBackend,
 }
 
+DBUS_BACKENDS = {
+    'ibus': IBUSDBusBackend,
+    'fcitx': FCITXDBusBackend,
+}
+
 
-class KeyboardLayout(base.PaddingMixin, base.MarginMixin, widget.KeyboardLayout):
+class KeyboardLayout(RunnerMixin, base.PaddingMixin, base.MarginMixin, widget.KeyboardLayout):
     def __init__(self, **config):
         base.InLoopPollText.__init__(self, **config)
         self.add_defaults(widget.KeyboardLayout.defaults)
@@ -124,6 +299,8 @@ class KeyboardLayout(base.PaddingMixin, base.MarginMixin, widget.KeyboardLayout)
         self.background = config.get('background', '#000000')
         self.rounded = config.get('rounded', True)
         self.backend_name = config.get('backend', True)
+        # 'dbus' talks to the input method daemon, 'command' forks its client
+        self.ipc = config.get('ipc', 'dbus')
 
     def _start_daemon(self):
         self.backend.start_daemon()
@@ -136,10 +313,40 @@ class KeyboardLayout(base.PaddingMixin, base.MarginMixin, widget.KeyboardLayout)
 
         self.prev_keyboard = self.configured_keyboards[0]
         self.prev_keyboard_time = time.time()
+        xkb.state.configure(self.configured_keyboards)
 
-        self.backend = BACKENDS[self.backend_name](qtile)
+        if self.ipc == 'dbus' and self.backend_name in DBUS_BACKENDS:
+            self.backend = DBUS_BACKENDS[self.backend_name](qtile)
+            self.backend.callback = self.on_keyboard
+        else:
+            self.ipc = 'command'
+            self.backend = BACKENDS[self.backend_name](qtile)
+        self.backend.owner = self.name
         # self.backend.set_keyboard(self.configured_keyboards[0], self.option)
 
+    async def _config_async(self):
+        await super()._config_async()
+        if self.ipc != 'dbus':
+            return
+
+        try:
+            await self.backend.start()
+        except (OSError, dbus.DBusError):
+            logger.exception('Cannot connect to the input method, forking its client:')
+            self.backend.stop()
+            self.ipc = 'command'
+            self.backend = BACKENDS[self.backend_name](self.qtile)
+            self.backend.owner = self.name
+            self.tick()
+
+    def finalize(self):
+        if self.ipc == 'dbus':
+            self.backend.stop()
+        super().finalize()
+
+    def on_keyboard(self):
+        self.update(self.poll())
+
     @expose_command()
     def next_keyboard(self):
         t = time.time()
@@ -161,6 +368,14 @@ class KeyboardLayout(base.PaddingMixin, base.MarginMixin, widget.KeyboardLayout)
             self.backend.set_keyboard(next_keyboard, self.option)
             self.tick()
 
+    def tick(self):
+        if self.ipc == 'dbus':
+            # render the cached input method, re-read it in the background
+            self.update(self.poll())
+            self.backend.refresh()
+        else:
+            self.poll_in_executor()
+
     def poll(self):
         keyboard = self.backend.get_keyboard()
         if keyboard in self.display_map.keys():
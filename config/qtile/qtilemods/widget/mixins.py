@@ -1,12 +1,10 @@
-import cairocffi
-import configparser
 import os
-import re
 
-from libqtile import images
+from libqtile.command.base import expose_command
 from libqtile.log_utils import logger
 
-from ..icon_theme import get_icon_path
+from .. import desktop_entry, icon_cache
+from ..tools import rfkill, runner
 
 
 def get_subdir_size(subdir):
@@ -20,46 +18,21 @@ def get_subdir_size(subdir):
 
 
 class IconTextMixin(object):
-    def _replace_svg_attr(self, match):
-        attr = match.group(0)
-        color = match.group(1)
-        delta = 255
-
-        if re.match(r'#[A-Fa-f0-9]{6}', color):
-            r = int(color[1:3], 16)
-            g = int(color[3:5], 16)
-            b = int(color[5:7], 16)
-            delta = max((abs(r - g), abs(r - b), abs(g - b)))
-
-        elif color in ('gray', 'grey', 'black', 'white'):
-            delta = 0
-
-        if delta < 32:
-            return attr.replace(color, self.foreground)
-        return attr
-
-    def setup_images(self):
-        d_imgs = {}
-        for icon_name in self.icon_names:
-            icon = get_icon_path(
+    def setup_images(self, icon_names=None):
+        if icon_names is None:
+            icon_names = self.icon_names
+
+        for icon_name in icon_names:
+            icon = icon_cache.lookup_icon(
                 icon_name, size=self.icon_size,
                 theme=self.theme_path, extensions=(self.icon_ext.lstrip('.'),))
-            if icon:
-                if icon.endswith('.svg'):  # symbolic icon
-                    with open(icon, 'r') as f:
-                        data = f.read()
-                        data = re.sub(r'fill="(#?[A-Za-z0-9]+)"', self._replace_svg_attr, data)
-                        data = re.sub(r'"fill:(#?[A-Za-z0-9]+)"', self._replace_svg_attr, data)
-                        d_imgs[icon_name] = images.Img(data.encode(), icon_name, icon)
-                else:
-                    with open(icon, 'rb') as f:
-                        d_imgs[icon_name] = images.Img(f.read(), icon_name, icon)
-
-        for key, img in d_imgs.items():
-            img.resize(height=self.icon_size)
+            if not icon:
+                continue
+
+            img = icon_cache.load_image(icon, self.foreground, self.icon_size)
             if img.width > self.length:
                 self.length = img.width + self.padding_x * 2
-            self.images[key] = img
+            self.images[icon_name] = img
 
     def draw(self):
         self.drawer.clear(self.background or self.bar.background)
@@ -79,19 +52,168 @@ class IconTextMixin(object):
         self.drawer.draw(offsetx=self.offset, offsety=self.offsety, width=self.length)
 
 
-class AppMixin(object):
-    def read_desktop_file(self, filepath):
-        config = configparser.ConfigParser()
+class RunnerMixin(object):
+    """Subprocesses through the shared runner, accounted to the widget name"""
+    _poll_future = None
+
+    def run_output(self, cmd, **kwargs):
+        return runner.check_output(cmd, owner=self.name, **kwargs)
+
+    def run_getoutput(self, cmd, **kwargs):
+        return runner.getoutput(cmd, owner=self.name, **kwargs)
 
+    def run_call(self, cmd, **kwargs):
+        return runner.call(cmd, owner=self.name, **kwargs)
+
+    def run_spawn(self, cmd, **kwargs):
+        return runner.spawn(cmd, owner=self.name, **kwargs)
+
+    async def run_async(self, cmd, **kwargs):
+        return await runner.run(cmd, owner=self.name, **kwargs)
+
+    def poll_in_executor(self):
+        """``tick`` of the InLoopPollText widgets whose poll forks"""
+        if self._poll_future is not None and not self._poll_future.done():
+            return
+
+        self._poll_future = self.qtile.run_in_executor(self.poll)
+        self._poll_future.add_done_callback(self._on_polled)
+
+    def _on_polled(self, future):
         try:
-            with open(os.path.join(filepath), 'r') as f:
-                data = f.read().replace('%', '%%')
-                config.read_string(data)
+            result = future.result()
+        except Exception:
+            logger.exception('poll() raised exceptions:')
+            return
 
-        except (configparser.InterpolationSyntaxError, KeyError):
-            logger.exception(f'Cannot read file {filepath}:')
+        if not self.finalized:
+            self.update(result)
 
-        return config
+    @expose_command()
+    def subprocess_stats(self, everyone=False):
+        """Forks and wall time of this widget, or of every widget"""
+        return runner.runner.get_stats(None if everyone else self.name)
+
+
+class RfkillMixin(object):
+    """Block state of ``rfkill_type`` pushed by the shared rfkill monitor
+
+    Meant to be used along RunnerMixin, the rest of the state is polled in
+    the executor once the radio is unblocked.
+    """
+    rfkill_type = None
+
+    async def _config_async(self):
+        await super()._config_async()
+        rfkill.monitor.subscribe(self.on_rfkill)
+
+    def finalize(self):
+        rfkill.monitor.unsubscribe(self.on_rfkill)
+        super().finalize()
+
+    def get_rfkill_signal(self):
+        """-3 when hard blocked, -2 when soft blocked, None otherwise"""
+        hard, soft = rfkill.monitor.state(self.rfkill_type)
+        if hard:
+            return -3
+        elif soft:
+            return -2
+
+    def update_rfkill_signal(self, signal):
+        self.update(signal)
+
+    def on_rfkill(self, type_name):
+        if type_name not in (self.rfkill_type, 'all'):
+            return
+
+        signal = self.get_rfkill_signal()
+        if signal is not None:
+            self.update_rfkill_signal(signal)
+        else:
+            future = self.qtile.run_in_executor(self.poll)
+            future.add_done_callback(self._on_polled)
+
+
+class VolumeStepMixin(object):
+    """Merge volume steps of a key repeat burst into single backend calls
+
+    Widgets implement ``get_volume_level`` (None when unknown),
+    ``show_volume_level`` for the optimistic render, the blocking
+    ``apply_volume_step`` which runs in the executor, and may override
+    ``reconcile_volume`` that runs once the burst is over. In-process
+    backends clear ``volume_step_blocking`` to apply steps on the loop.
+    """
+    volume_step_blocking = True
+    _step_future = None
+    _step_pending = 0
+    _step_level = None
+
+    @property
+    def volume_step_busy(self):
+        return self._step_future is not None or bool(self._step_pending)
+
+    def queue_volume_step(self, delta):
+        level = self._step_level if self.volume_step_busy else self.get_volume_level()
+        if level is not None:
+            new_level = min(max(level + delta, 0), 100)
+            self.show_volume_level(new_level)
+            if new_level == level:
+                return
+            level = new_level
+
+        self._step_level = level
+        self._step_pending += delta
+        self._flush_volume_steps()
+
+    def _flush_volume_steps(self):
+        if self._step_future is not None or not self._step_pending:
+            return
+
+        delta, self._step_pending = self._step_pending, 0
+        if not self.volume_step_blocking:
+            try:
+                self.apply_volume_step(self._step_level, delta)
+            except Exception:
+                logger.exception('Cannot change volume:')
+            self._step_level = None
+            self.reconcile_volume()
+            return
+
+        self._step_future = self.qtile.run_in_executor(
+            self.apply_volume_step, self._step_level, delta)
+        self._step_future.add_done_callback(self._on_volume_step_done)
+
+    def _on_volume_step_done(self, future):
+        self._step_future = None
+        try:
+            future.result()
+        except Exception:
+            logger.exception('Cannot change volume:')
+
+        if self._step_pending:
+            self._flush_volume_steps()
+        else:
+            self._step_level = None
+            self.reconcile_volume()
+
+    def reconcile_volume(self):
+        future = self.qtile.run_in_executor(self.poll)
+        future.add_done_callback(self._on_volume_reconciled)
+
+    def _on_volume_reconciled(self, future):
+        try:
+            result = future.result()
+        except Exception:
+            logger.exception('Cannot read volume:')
+            return
+
+        if not self.volume_step_busy:
+            self.update(result)
+
+
+class AppMixin(object):
+    def read_desktop_file(self, filepath):
+        return desktop_entry.read_desktop_file(filepath)
 
     def get_icons(self, themepath):
         results = []
@@ -157,42 +279,10 @@ class AppMixin(object):
             return surface
 
     def get_desktop_files(self):
-        desktops = []
-
-        apps_paths = (
-            os.path.expanduser('~/.local/share/applications'),
-            '/usr/local/share/applications',
-            '/usr/share/applications',
-            '/var/lib/flatpak/exports/share/applications',
-        )
-
-        for apps_path in apps_paths:
-            if not os.path.isdir(apps_path):
-                continue
-
-            for filename in os.listdir(apps_path):
-                if not filename.endswith('.desktop'):
-                    continue
-
-                filepath = os.path.join(apps_path, filename)
-                desktop = self.read_desktop_file(filepath)
-                desktops.append((filepath, desktop))
-
-        return desktops
+        desktop_entry.catalog.watch()
+        return desktop_entry.catalog.items()
 
     def get_icon_surface(self, filepath, size):
         if not os.path.exists(filepath):
             return
-        icon = images.Img.from_path(filepath)
-        img = icon.surface
-        surface = cairocffi.SurfacePattern(img)
-        height = img.get_height()
-        width = img.get_width()
-        scaler = cairocffi.Matrix()
-        if height != size:
-            sp = height / size
-            height = size
-            width /= sp
-            scaler.scale(sp, sp)
-        surface.set_matrix(scaler)
-        return surface
+        return icon_cache.load_image(filepath, None, size).pattern
@@ -1,4 +1,3 @@
-import json
 import re
 import os
 import subprocess
@@ -8,10 +7,11 @@ from libqtile.command.base import expose_command
 from libqtile.log_utils import logger
 from libqtile.widget import base
 
-from .mixins import IconTextMixin
+from ..tools import dbus, networkmanager, wireless
+from .mixins import IconTextMixin, RfkillMixin, RunnerMixin
 
 
-class NetworkManager(IconTextMixin, base.MarginMixin, base.PaddingMixin, base.InLoopPollText):
+class NetworkManager(RfkillMixin, RunnerMixin, IconTextMixin, base.MarginMixin, base.PaddingMixin, base.InLoopPollText):
     icon_names = (
         'network-vpn-symbolic',
         'network-idle-symbolic',
@@ -35,6 +35,7 @@ class NetworkManager(IconTextMixin, base.MarginMixin, base.PaddingMixin, base.In
         'network-wireless-signal-weak-secure-symbolic',
         'network-wireless-signal-weak-symbolic',
     )
+    rfkill_type = 'wlan'
 
     def __init__(self, **config):
         self.network_app = config.get('network_app')
@@ -43,6 +44,9 @@ class NetworkManager(IconTextMixin, base.MarginMixin, base.PaddingMixin, base.In
         self.icon_spacing = config.get('icon_spacing', 0)
         self.images = {}
         self.signal = -1
+        self.connection_types = ()
+        # 'dbus' mirrors NetworkManager signals, 'nmcli' polls the command
+        self.backend = config.get('backend', 'dbus')
 
         base.InLoopPollText.__init__(self, width=bar.STRETCH, **config)
         self.add_defaults(base.PaddingMixin.defaults)
@@ -95,13 +99,37 @@ class NetworkManager(IconTextMixin, base.MarginMixin, base.PaddingMixin, base.In
         base.ThreadPoolText._configure(self, qtile, pbar)
         self.setup_images()
 
+    def timer_setup(self):
+        if self.backend != 'dbus':
+            base.InLoopPollText.timer_setup(self)
+
+    async def _config_async(self):
+        await super()._config_async()
+        if self.backend != 'dbus':
+            return
+
+        try:
+            await networkmanager.state.start()
+        except (OSError, dbus.DBusError):
+            logger.exception('Cannot connect to NetworkManager, falling back to nmcli:')
+            self.backend = 'nmcli'
+            base.InLoopPollText.timer_setup(self)
+            return
+
+        networkmanager.state.subscribe(self.on_network)
+        self.on_network()
+
+    def finalize(self):
+        networkmanager.state.unsubscribe(self.on_network)
+        super().finalize()
+
+    def on_network(self):
+        self.update(self.poll())
+
     @property
     def interfaces(self):
         has_wifi = False
-        out = subprocess.check_output(['nmcli', '-f', 'type', 'c', 'show', '--active']).decode()
-        for line in out.split('\n'):
-            ctype = line.strip()
-
+        for ctype in self.connection_types:
             if ctype == 'vpn':
                 yield 'network-vpn-symbolic'
 
@@ -131,29 +159,48 @@ class NetworkManager(IconTextMixin, base.MarginMixin, base.PaddingMixin, base.In
                 yield 'network-wireless-offline-symbolic'
 
     def get_signal(self):
-        rfkill = json.loads(subprocess.check_output(['rfkill', '-J']).decode())
-        for dev in rfkill['rfkilldevices']:
-            if dev['type'] == 'wlan' and dev['hard'] == 'blocked':
-                return -3
-            elif dev['type'] == 'wlan' and dev['soft'] == 'blocked':
-                return -2
-
-        out = subprocess.check_output([
+        signal = self.get_rfkill_signal()
+        if signal is not None:
+            return signal
+
+        if self.backend == 'dbus':
+            return networkmanager.state.signal
+
+        signal = wireless.get_signal()
+        if signal is not None:
+            return signal
+
+        out = self.run_output([
             'nmcli', '-f', 'in-use,signal',
-            'd', 'wifi', 'list', '--rescan', 'no']).decode()
+            'd', 'wifi', 'list', '--rescan', 'no'])
         for line in out.split('\n'):
             if line.strip().startswith('*'):
                 return int(line.strip().lstrip('*'))
         else:
             return -1
 
+    def get_connection_types(self):
+        if self.backend == 'dbus':
+            return networkmanager.state.connection_types()
+
+        out = self.run_output(['nmcli', '-f', 'type', 'c', 'show', '--active'])
+        return tuple(line.strip() for line in out.split('\n') if line.strip())
+
+    def update_rfkill_signal(self, signal):
+        self.update((signal, self.connection_types))
+
+    def tick(self):
+        self.poll_in_executor()
+
     def poll(self):
-        return self.get_signal()
+        return self.get_signal(), self.get_connection_types()
 
-    def update(self, signal):
-        if signal != self.signal:
+    def update(self, state):
+        signal, connection_types = state
+        if signal != self.signal or connection_types != self.connection_types:
             self.signal = signal
-            self.draw()
+            self.connection_types = connection_types
+            self.bar.draw()
 
     def box_width(self, interfaces):
         return (self.icon_size + self.icon_spacing) * len(interfaces)
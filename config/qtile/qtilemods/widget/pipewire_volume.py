@@ -1,15 +1,15 @@
-import json
+import asyncio
 import re
 import os
 import subprocess
 
-from libqtile import bar, widget, images, qtile
+from libqtile import bar, widget, qtile
 from libqtile.command.base import expose_command
 from libqtile.log_utils import logger
 from libqtile.widget import base
 
-from .mixins import IconTextMixin
-from ..icon_theme import get_icon_path
+from .mixins import IconTextMixin, RunnerMixin, VolumeStepMixin
+from ..tools import pipewire, runner
 
 
 ICON_NAMES = (
@@ -20,7 +20,7 @@ ICON_NAMES = (
 )
 
 
-class PipewireVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
+class PipewireVolume(RunnerMixin, VolumeStepMixin, IconTextMixin, base.PaddingMixin, base.InLoopPollText):
     """Widget that display and change volume
 
     This widget uses ``wpctl`` to get and set the volume so users
@@ -37,6 +37,7 @@ class PipewireVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
         ("theme_path", None, "Path of the icons"),
         ("step", 2, "Volume change for up an down commands in percentage."),
         ("icon_names", ICON_NAMES, "Icon names."),
+        ("monitor", True, "Follow ``pw-dump --monitor`` instead of polling ``wpctl``."),
     ]
 
 
@@ -69,35 +70,56 @@ class PipewireVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
         base.ThreadPoolText._configure(self, qtile, pbar)
         self.setup_images()
 
+    def timer_setup(self):
+        if not self.monitor:
+            base.InLoopPollText.timer_setup(self)
+
+    def tick(self):
+        if self.monitoring:
+            self._on_graph_changed()
+        else:
+            self.poll_in_executor()
+
+    async def _config_async(self):
+        if not self.monitor:
+            return
+
+        if pipewire.graph.start():
+            pipewire.graph.subscribe(self._on_graph_changed)
+            self._on_graph_changed()
+        else:
+            self.monitor = False
+            base.InLoopPollText.timer_setup(self)
+
+    def finalize(self):
+        pipewire.graph.unsubscribe(self._on_graph_changed)
+        super().finalize()
+
+    def _on_graph_changed(self):
+        if pipewire.graph.ready and not self.volume_step_busy:
+            self.update(self.poll())
+
+    @property
+    def monitoring(self):
+        return self.monitor and pipewire.graph.running and pipewire.graph.ready
+
     def setup_images(self):
-        d_imgs = {}
-        for icon_level, icon_name in self.icon_names:
-            icon = get_icon_path(
-                icon_name, size=self.icon_size,
-                theme=self.theme_path, extensions=(self.icon_ext.lstrip('.'),))
-            if icon:
-                if icon.endswith('.svg'):  # symbolic icon
-                    with open(icon, 'r') as f:
-                        data = re.sub(r'fill="(#?[A-Za-z0-9]+)"', self._replace_svg_attr, f.read())
-                        d_imgs[icon_name] = images.Img(data.encode(), icon_name, icon)
-                else:
-                    with open(icon, 'rb') as f:
-                        d_imgs[icon_name] = images.Img(f.read(), icon_name, icon)
-
-        for key, img in d_imgs.items():
-            img.resize(height=self.icon_size)
-            if img.width > self.length:
-                self.length = img.width + self.padding_x * 2
-            self.images[key] = img
+        super().setup_images(icon_name for icon_level, icon_name in self.icon_names)
 
     def calculate_length(self):
         return self.icon_size + self.padding_x * 2
 
     def get_volume(self):
+        if self.monitoring:
+            node = pipewire.graph.resolve(self.channel, self.media_class)
+            state = pipewire.graph.node_volume(node)
+            if state is not None:
+                volume, muted = state
+                return -1 if muted else volume
+
         try:
-            cmd = subprocess.list2cmdline(['wpctl', 'get-volume', self.channel])
-            mixer_out = subprocess.getoutput(cmd)
-        except subprocess.CalledProcessError:
+            mixer_out = self.run_getoutput(['wpctl', 'get-volume', self.channel])
+        except (OSError, subprocess.TimeoutExpired):
             return -1
 
         if '[MUTED]' in mixer_out:
@@ -122,123 +144,100 @@ class PipewireVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
 
     @expose_command()
     def increase_vol(self):
-        if self.volume < 100:
-            value = '100%'
-            if self.volume + self.step < 100:
-                value = '{}%+'.format(self.step)
-
-            cmd = subprocess.list2cmdline(['wpctl', 'set-volume', self.channel, str(value)])
-            subprocess.call(cmd, shell=True)
-            self.update(self.poll())
-
-        if self.volume >= 0:
-            text = '{}%'.format(self.volume)
-            qtile.widgets_map['notification'].update(text, self.volume / 100)
+        self.queue_volume_step(self.step)
 
     @expose_command()
     def decrease_vol(self):
-        if self.volume > 0:
-            value = '0%'
-            if self.volume - self.step > 0:
-                value = '{}%-'.format(self.step)
+        self.queue_volume_step(-self.step)
 
-            cmd = subprocess.list2cmdline(['wpctl', 'set-volume', self.channel, str(value)])
-            subprocess.call(cmd, shell=True)
-            self.update(self.poll())
+    def get_volume_level(self):
+        # muted nodes do not report their level, step it relatively
+        if self.volume < 0:
+            return None
+        return self.volume
 
-        if self.volume >= 0:
-            text = '{}%'.format(self.volume)
-            qtile.widgets_map['notification'].update(text, self.volume / 100)
+    def show_volume_level(self, level):
+        self.update(level)
 
-    @expose_command()
-    def mute(self):
-        cmd = subprocess.list2cmdline(['wpctl', 'set-mute', self.channel, 'toggle'])
-        subprocess.call(cmd, shell=True)
-        self.update(self.poll())
+        text = '{}%'.format(self.volume)
+        qtile.widgets_map['notification'].update(text, self.volume / 100)
+
+    def apply_volume_step(self, level, delta):
+        if level is None:
+            value = '{}%{}'.format(abs(delta), '+' if delta > 0 else '-')
+        else:
+            value = f'{level}%'
+        self.run_call(['wpctl', 'set-volume', self.channel, value])
 
-    def _get_data(self):
-        output = subprocess.check_output(['pw-dump', '--no-colors']).decode()
-        # merge multiple arrays to fix invalid json
-        output = output.replace(']\n[', ',')
-        return json.loads(output)
-
-    def _get_metadata(self, data):
-        metadata = []
-        for item in data:
-            if item.get('type') == 'PipeWire:Interface:Metadata':
-                if item.get('props', {}).get('metadata.name') == 'default':
-                    metadata = item.get('metadata', [])
-
-        return metadata
-
-    def _get_current_channel_name(self, data):
-        key = 'default.{}'.format(self.media_class.replace('/', '.').lower())
-        for option in self._get_metadata(data):
-            if option.get('key') == key:
-                return option.get('value', {}).get('name')
-
-    def _get_current_channel(self, data):
-        current_channel_name = self._get_current_channel_name(data)
-        for item in data:
-            if not item.get('info'):
-                continue
-
-            props = item['info'].get('props', {})
-            if props.get('media.class') != self.media_class:
-                continue
-
-            name = props.get('node.name')
-            if name == current_channel_name:
-                return item
+    def reconcile_volume(self):
+        if self.monitoring:
+            self._on_graph_changed()
+        else:
+            super().reconcile_volume()
 
     @expose_command()
-    def next_channel(self):
-        data = self._get_data()
-        current_channel = self._get_current_channel(data)
+    def mute(self):
+        callback = None
+        if not self.monitoring:
+            callback = lambda returncode: self.tick()
+        self.run_spawn(['wpctl', 'set-mute', self.channel, 'toggle'], callback=callback)
 
-        current_channel_index = None
-        channels = []
-        for item in data:
-            if not item.get('info'):
-                continue
+    async def _get_data(self):
+        output = await self.run_async(['pw-dump', '--no-colors'])
+        # pw-dump may print several arrays
+        values, _ = pipewire.decode_stream(output)
+        return [obj for value in values for obj in value]
 
-            props = item['info'].get('props', {})
-            if props.get('media.class') != self.media_class:
-                continue
+    async def _get_graph(self):
+        if self.monitoring:
+            return pipewire.graph
 
-            if item['id'] == current_channel['id']:
-                current_channel_index = len(channels)
+        graph = pipewire.PipewireGraph()
+        graph.apply(await self._get_data())
+        return graph
 
-            channels.append(item)
+    @expose_command()
+    def next_channel(self):
+        asyncio.create_task(self._next_channel())
 
-        if current_channel_index is None:
+    async def _next_channel(self):
+        graph = await self._get_graph()
+        current_channel = graph.default_node(self.media_class)
+        channels = graph.nodes(self.media_class)
+        if current_channel not in channels:
             return
 
+        current_channel_index = channels.index(current_channel)
         for _ in range(len(channels)):
             current_channel_index += 1
             if current_channel_index >= len(channels):
                 current_channel_index = 0
 
             new_channel = channels[current_channel_index]
-            new_props = new_channel.get('info', {}).get('props', {})
+            new_props = pipewire.get_props(new_channel)
             new_id = str(new_channel['id'])
             new_name = new_props.get('node.name')
             logger.error(f'Switching to "{new_id}. {new_name}"')
             cmd = ['wpctl', 'set-default', new_id]
             logger.error(' '.join(cmd))
-            subprocess.check_output(cmd)
+            await runner.run_call(cmd, owner=self.name)
+
+            if graph is pipewire.graph:
+                switched = await graph.wait_for(
+                    lambda: graph.default_node(self.media_class) is new_channel)
+            else:
+                graph = await self._get_graph()
+                current_channel = graph.default_node(self.media_class)
+                switched = current_channel is not None and current_channel['id'] == new_channel['id']
 
-            data = self._get_data()
-            current_channel = self._get_current_channel(data)
-            if new_channel['id'] == current_channel['id']:
+            if switched:
                 break
             else:
                 logger.error(f'Cannot switch to "{new_id}. {new_name}"')
         else:
             return
 
-        props = current_channel.get('info', {}).get('props', {})
-        desc = props.get('node.description')
+        desc = new_props.get('node.description') or new_name or new_id
         desc = desc.replace('Audio Controller', '')
         if len(desc) > 30:
             desc = desc[:30-3] + '...'
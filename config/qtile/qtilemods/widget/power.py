@@ -1,7 +1,6 @@
 import json
 import re
 import os
-import subprocess
 
 from libqtile import bar, widget, images
 from libqtile.command.base import expose_command
@@ -10,7 +9,7 @@ from libqtile.widget import base
 
 from qtilemods.tools import shortcuts
 
-from .mixins import IconTextMixin
+from .mixins import IconTextMixin, RunnerMixin
 
 POWER_PROFILES = (
     'power-saver',
@@ -25,7 +24,7 @@ TUNED_PROFILES = (
 )
 
 
-class Power(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
+class Power(RunnerMixin, IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
     icon_names = (
         'power-profile-power-saver-symbolic',
         'power-profile-balanced-symbolic',
@@ -74,34 +73,47 @@ class Power(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
         if profile_index >= 3:
             profile_index = 0
 
-        self.set_profile_index(profile_index)
+        # render at once, the profile is applied in the background
+        self.update(profile_index)
+        self.set_profile_index(profile_index, wait=False)
 
         if self.callback:
             self.callback(profile_index)
 
-        self.update(self.poll())
-
-    def set_profile_index(self, profile_index):
-        if profile_index is None:
-            return
-
+    def get_profile_command(self, profile_index):
         if os.path.exists('/usr/sbin/tuned-adm'):
             profile = TUNED_PROFILES[profile_index]
             logger.error(f'Switching profile to: {profile}')
-            subprocess.call(['tuned-adm', 'profile', profile])
+            return ['tuned-adm', 'profile', profile]
         else:
             profile = POWER_PROFILES[profile_index]
             logger.error(f'Switching profile to: {profile}')
-            subprocess.call(['powerprofilesctl', 'set', profile])
+            return ['powerprofilesctl', 'set', profile]
+
+    def set_profile_index(self, profile_index, wait=True):
+        if profile_index is None:
+            return
+
+        cmd = self.get_profile_command(profile_index)
+        if wait:
+            self.run_call(cmd)
+        else:
+            self.run_spawn(cmd, callback=self._on_profile_set)
 
         if profile_index == 1:  # middle
             shortcuts.spawn('picom')()
+        elif wait:
+            self.run_call(['pkill', 'picom'])
         else:
-            subprocess.run(['pkill', 'picom'])
+            self.run_spawn(['pkill', 'picom'])
+
+    def _on_profile_set(self, returncode):
+        future = self.qtile.run_in_executor(self.poll)
+        future.add_done_callback(self._on_polled)
 
     def get_profile_index(self):
         if os.path.exists('/usr/sbin/tuned-adm'):
-            output = subprocess.check_output(['tuned-adm', 'active']).decode().strip('\n')
+            output = self.run_output(['tuned-adm', 'active']).strip('\n')
             key, _, value = output.partition(':')
             profile = value.strip()
             logger.error(f'Current profile: {profile}')
@@ -110,7 +122,7 @@ class Power(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
             return TUNED_PROFILES.index(profile)
 
         else:
-            profile = subprocess.check_output(['powerprofilesctl', 'get']).decode().strip('\n')
+            profile = self.run_output(['powerprofilesctl', 'get']).strip('\n')
             logger.error(f'Current profile: {profile}')
             if profile not in POWER_PROFILES:
                 return 1
@@ -1,16 +1,15 @@
+import asyncio
 import json
 import re
 import os
 import subprocess
 
-from libqtile import bar, widget, images, qtile
+from libqtile import bar, widget, qtile
 from libqtile.command.base import expose_command
 from libqtile.log_utils import logger
 from libqtile.widget import base
 
-from .mixins import IconTextMixin
-from ..icon_theme import get_icon_path
-from ..tools import shortcuts
+from .mixins import IconTextMixin, RunnerMixin, VolumeStepMixin
 
 
 ICON_NAMES = (
@@ -20,8 +19,14 @@ ICON_NAMES = (
     (100, 'audio-volume-high-symbolic'),
 )
 
+# Event 'change' on sink #52
+re_event = re.compile(r"Event '(\w+)' on ([\w-]+)(?: #(\d+))?")
+# Volume: front-left: 65536 / 100% / 0.00 dB, ...
+re_volume = re.compile(r'(\d+)%')
+re_mute = re.compile(r'Mute: (yes|no)')
 
-class PulseVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
+
+class PulseVolume(RunnerMixin, VolumeStepMixin, IconTextMixin, base.PaddingMixin, base.InLoopPollText):
     """Widget that display and change volume
 
     This widget uses ``pactl`` to get and set the volume so users
@@ -39,6 +44,7 @@ class PulseVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
         ("step", 2, "Volume change for up an down commands in percentage."),
         ("icon_names", ICON_NAMES, "Icon names."),
         ("volume_app", None, "App to control volume"),
+        ("subscribe", True, "Follow ``pactl subscribe`` events instead of polling."),
     ]
 
     def __init__(self, **config):
@@ -52,6 +58,8 @@ class PulseVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
         self.icon_names = config.get('icon_names', ICON_NAMES)
         self.images = {}
         self.volume = 0
+        self.level = 0
+        self.muted = False
         self.current_icon = self.icon_names[0][1]
 
         self.add_callbacks({
@@ -64,6 +72,13 @@ class PulseVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
 
         self.add_defaults(base.PaddingMixin.defaults)
 
+        self._subscriber = None
+        self._refresh_task = None
+        self._refresh_pending = False
+        self._refresh_default = False
+        self._default_name = None
+        self._default_index = None
+
     def _configure(self, qtile, pbar):
         if self.theme_path:
             self.length_type = bar.STATIC
@@ -71,42 +86,157 @@ class PulseVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
         base.ThreadPoolText._configure(self, qtile, pbar)
         self.setup_images()
 
-    def setup_images(self):
-        d_imgs = {}
-        for icon_level, icon_name in self.icon_names:
-            icon = get_icon_path(
-                icon_name, size=self.icon_size,
-                theme=self.theme_path, extensions=(self.icon_ext.lstrip('.'),))
-            if icon:
-                if icon.endswith('.svg'):  # symbolic icon
-                    with open(icon, 'r') as f:
-                        data = re.sub(r'fill="(#?[A-Za-z0-9]+)"', self._replace_svg_attr, f.read())
-                        d_imgs[icon_name] = images.Img(data.encode(), icon_name, icon)
+    def timer_setup(self):
+        if not self.subscribe:
+            base.InLoopPollText.timer_setup(self)
+
+    def tick(self):
+        if self.subscribed:
+            self.refresh()
+        else:
+            self.poll_in_executor()
+
+    async def _config_async(self):
+        if self.subscribe:
+            self._start_subscriber()
+
+    def _start_subscriber(self):
+        if not self.finalized:
+            self._subscriber = asyncio.create_task(self._subscribe())
+
+    async def _subscribe(self):
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                'pactl', 'subscribe',
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        except OSError:
+            logger.exception('Cannot run pactl subscribe, falling back to polling:')
+            self.subscribe = False
+            base.InLoopPollText.timer_setup(self)
+            return
+
+        self.refresh(default=True)
+        try:
+            async for line in proc.stdout:
+                match = re_event.match(line.decode(errors='replace'))
+                if match is None:
+                    continue
+
+                event, facility, index = match.groups()
+                if facility == 'server':
+                    self.refresh(default=True)
+                elif facility != self.media_class:
+                    continue
+                elif self._default_index is None:
+                    self.refresh(default=True)
+                elif index == str(self._default_index):
+                    if event == 'remove':
+                        self._default_index = None
+                        self.refresh(default=True)
+                    else:
+                        self.refresh()
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+
+        # the sound server went away, pactl exits with it
+        logger.warning('pactl subscribe exited, restarting')
+        self.timeout_add(1, self._start_subscriber)
+
+    def refresh(self, default=False):
+        self._refresh_default = self._refresh_default or default
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_pending = True
+            return
+
+        self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def _refresh(self):
+        while True:
+            self._refresh_pending = False
+            default, self._refresh_default = self._refresh_default, False
+
+            try:
+                if default or self._default_index is None:
+                    output = await self._pactl(f'get-default-{self.media_class}')
+                    name = output.strip('\n')
+                    if name != self._default_name or self._default_index is None:
+                        # a new default, find its index once
+                        self._default_name = name
+                        data = json.loads(await self._pactl(
+                            '-f', 'json', 'list', f'{self.media_class}s'))
+                        self._set_state(data, name)
                 else:
-                    with open(icon, 'rb') as f:
-                        d_imgs[icon_name] = images.Img(f.read(), icon_name, icon)
+                    await self._read_default()
+            except (OSError, ValueError, subprocess.SubprocessError):
+                logger.exception('Cannot read pactl state:')
+
+            if not self._refresh_pending:
+                break
 
-        for key, img in d_imgs.items():
-            img.resize(height=self.icon_size)
-            if img.width > self.length:
-                self.length = img.width + self.padding_x * 2
-            self.images[key] = img
+    async def _pactl(self, *args, dedupe=True):
+        return await self.run_async(['pactl', *args], dedupe=dedupe)
+
+    async def _read_default(self):
+        """Volume and mute of the default device only, from its change events"""
+        index = str(self._default_index)
+        # untranslated, the output is parsed
+        volume, mute = await asyncio.gather(
+            self.run_async(['env', 'LC_ALL=C', 'pactl', f'get-{self.media_class}-volume', index]),
+            self.run_async(['env', 'LC_ALL=C', 'pactl', f'get-{self.media_class}-mute', index]))
+
+        volume_match = re_volume.search(volume)
+        mute_match = re_mute.search(mute)
+        if volume_match is None or mute_match is None:
+            raise ValueError(f'Cannot parse pactl output: {volume!r} {mute!r}')
+        self._show_state(int(volume_match.group(1)), mute_match.group(1) == 'yes')
+
+    async def _pactl_set(self, *args):
+        try:
+            await self._pactl(*args, dedupe=False)
+        except (OSError, subprocess.SubprocessError):
+            logger.exception('Cannot set pactl state:')
+            self.refresh()
+
+    @property
+    def subscribed(self):
+        return self._subscriber is not None and not self._subscriber.done()
+
+    def finalize(self):
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            self._subscriber = None
+        super().finalize()
+
+    def setup_images(self):
+        super().setup_images(icon_name for icon_level, icon_name in self.icon_names)
 
     def calculate_length(self):
         return self.icon_size + self.padding_x * 2
 
     def get_volume(self):
-        channel = self._get_current_channel_name()
+        channel = self._get_current_channel_name_sync()
+        return self._set_state(self._get_data_sync(), channel)
 
-        data = self._get_data()
+    def _set_state(self, data, channel):
         for item in data:
             if item['name'] == channel:
-                if item['mute']:
-                    return -1
+                self._default_index = item.get('index')
                 volume = item['volume']['front-left']['value_percent']
-                return int(volume.rstrip('%'))
+                return self._show_state(int(volume.rstrip('%')), item['mute'])
 
-        return -1
+        self._default_index = None
+        return self._show_state(0, True)
+
+    def _show_state(self, level, muted):
+        self.level = level
+        self.muted = muted
+
+        volume = -1 if self.muted else self.level
+        if self.subscribed and not self.volume_step_busy:
+            self.update(volume)
+        return volume
 
     def get_icon_key(self, volume):
         for icon_level, icon_name in self.icon_names:
@@ -117,51 +247,76 @@ class PulseVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
 
     @expose_command()
     def increase_vol(self):
-        if self.volume < 100:
-            volume = min(self.volume + self.step, 100)
-            cmd = subprocess.list2cmdline([
-                'pactl', f'set-{self.media_class}-volume', self.channel, f'{volume}%'])
-            subprocess.call(cmd, shell=True)
-            self.update(self.poll())
-
-        if self.volume >= 0:
-            text = '{}%'.format(self.volume)
-            qtile.widgets_map['notification'].update(text, self.volume / 100)
+        self.queue_volume_step(self.step)
 
     @expose_command()
     def decrease_vol(self):
-        if self.volume > 0:
-            volume = max(self.volume - self.step, 0)
-            cmd = subprocess.list2cmdline([
-                'pactl', f'set-{self.media_class}-volume', self.channel, f'{volume}%'])
-            subprocess.call(cmd, shell=True)
-            self.update(self.poll())
+        self.queue_volume_step(-self.step)
+
+    def get_volume_level(self):
+        return self.level
+
+    def show_volume_level(self, level):
+        self.level = level
+        self.update(-1 if self.muted else level)
 
         if self.volume >= 0:
             text = '{}%'.format(self.volume)
             qtile.widgets_map['notification'].update(text, self.volume / 100)
 
+    def apply_volume_step(self, level, delta):
+        self.run_call([
+            'pactl', f'set-{self.media_class}-volume', self.channel, f'{level}%'])
+
+    def reconcile_volume(self):
+        if self.subscribed:
+            # the change events carry the state, re-read it once the burst is over
+            self.refresh()
+        else:
+            super().reconcile_volume()
+
     @expose_command()
     def mute(self):
-        cmd = subprocess.list2cmdline([
-            'pactl', f'set-{self.media_class}-mute', self.channel, 'toggle'])
-        subprocess.call(cmd, shell=True)
-        self.update(self.poll())
-
-    def _get_data(self):
-        output = subprocess.check_output([
-            'pactl', '-f', 'json', 'list', f'{self.media_class}s']).decode()
+        if self.subscribed:
+            self.muted = not self.muted
+            self.update(-1 if self.muted else self.level)
+            asyncio.create_task(self._pactl_set(
+                f'set-{self.media_class}-mute', self.channel, 'toggle'))
+            return
+
+        self.run_spawn(
+            ['pactl', f'set-{self.media_class}-mute', self.channel, 'toggle'],
+            callback=lambda returncode: self.tick())
+
+    async def _get_data(self):
+        output = await self._pactl('-f', 'json', 'list', f'{self.media_class}s')
+        return json.loads(output)
+
+    async def _get_current_channel_name(self):
+        output = await self._pactl(f'get-default-{self.media_class}', dedupe=False)
+        return output.strip('\n')
+
+    def _get_data_sync(self):
+        output = self.run_output([
+            'pactl', '-f', 'json', 'list', f'{self.media_class}s'])
         return json.loads(output)
 
-    def _get_current_channel_name(self):
-        output = subprocess.check_output([
-            'pactl', f'get-default-{self.media_class}']).decode()
+    def _get_current_channel_name_sync(self):
+        output = self.run_output([
+            'pactl', f'get-default-{self.media_class}'])
         return output.strip('\n')
 
     @expose_command()
     def next_channel(self):
-        data = self._get_data()
-        current_channel = self._get_current_channel_name()
+        asyncio.create_task(self._next_channel())
+
+    async def _next_channel(self):
+        try:
+            data = await self._get_data()
+            current_channel = await self._get_current_channel_name()
+        except (OSError, ValueError, subprocess.SubprocessError):
+            logger.exception('Cannot read pactl state:')
+            return
 
         current_channel_index = None
         channels = []
@@ -185,11 +340,15 @@ class PulseVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
             new_channel = channels[current_channel_index]
             new_name = new_channel['name']
             logger.error(f'Switching to "{new_name}"')
-            cmd = ['pactl', f'set-default-{self.media_class}', new_name]
-            logger.error(' '.join(cmd))
-            subprocess.check_output(cmd)
+            args = (f'set-default-{self.media_class}', new_name)
+            logger.error(' '.join(('pactl',) + args))
+            try:
+                await self._pactl(*args, dedupe=False)
+                current_channel = await self._get_current_channel_name()
+            except (OSError, subprocess.SubprocessError):
+                logger.exception(f'Cannot switch to "{new_name}"')
+                continue
 
-            current_channel = self._get_current_channel_name()
             if new_channel['name'] == current_channel:
                 break
             else:
@@ -203,7 +362,10 @@ class PulseVolume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
             desc = desc[:30-3] + '...'
         qtile.widgets_map['notification'].update(desc)
 
-        self.update(self.poll())
+        if self.subscribed:
+            self.refresh(default=True)
+        else:
+            self.poll_in_executor()
 
     @expose_command()
     def run_app(self):
@@ -3,14 +3,13 @@ import re
 import os
 import subprocess
 
-from libqtile import bar, widget, images, qtile
+from libqtile import bar, widget, qtile
 from libqtile.command.base import expose_command
 from libqtile.log_utils import logger
 from libqtile.widget import base
 
-from .mixins import IconTextMixin
-from ..icon_theme import get_icon_path
-from ..tools import shortcuts
+from .mixins import IconTextMixin, RunnerMixin, VolumeStepMixin
+from ..tools import alsa
 
 
 ICON_NAMES = (
@@ -23,7 +22,7 @@ ICON_NAMES = (
 re_vol = re.compile(r"(\d?\d?\d?)%")
 
 
-class Volume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
+class Volume(RunnerMixin, VolumeStepMixin, IconTextMixin, base.PaddingMixin, base.InLoopPollText):
     """Widget that display and change volume
 
     By default, this widget uses ``amixer`` to get and set the volume so users
@@ -81,6 +80,12 @@ class Volume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
             "Only used if ``volume_up_command`` and ``volume_down_command`` are not set.",
         ),
         ("icon_names", ICON_NAMES, "Icon names."),
+        (
+            "mixer_backend",
+            "auto",
+            "``alsa`` follows the mixer in-process through libasound, ``amixer`` polls "
+            "the commands. ``auto`` uses alsa unless custom commands are set.",
+        ),
     ]
 
     def __init__(self, **config):
@@ -89,6 +94,9 @@ class Volume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
         self.images = {}
         self.volume = None
         self.is_mute = False
+        self.mixer = None
+        self.element = None
+        self._mixer_tried = False
         self.current_icon = self.icon_names[0][1]
 
         self.volume_app = config.get('volume_app')
@@ -114,44 +122,101 @@ class Volume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
         base.ThreadPoolText._configure(self, qtile, pbar)
         self.setup_images()
 
+    def timer_setup(self):
+        # the base class reschedules this method, pick the backend only once
+        if not self._mixer_tried:
+            self._mixer_tried = True
+            if self.setup_mixer():
+                self.update(self.poll())
+                return
+        base.InLoopPollText.timer_setup(self)
+
+    def tick(self):
+        if self.element is not None:
+            self.update(self.poll())
+        else:
+            self.poll_in_executor()
+
+    def setup_mixer(self):
+        if self.mixer_backend == 'amixer':
+            return False
+
+        commands = (
+            self.get_volume_command, self.check_mute_command, self.mute_command,
+            self.volume_up_command, self.volume_down_command)
+        if self.mixer_backend == 'auto' and any(commands):
+            return False
+
+        device = self.device
+        if device is None:
+            device = 'default' if self.cardid is None else f'hw:{self.cardid}'
+
+        try:
+            self.mixer = alsa.Mixer(device)
+            self.element = self.mixer.element(self.channel)
+            self.mixer.start(self.on_mixer_event, error_callback=self.on_mixer_error)
+        except OSError:
+            logger.exception('Cannot open ALSA mixer, falling back to amixer:')
+            self.close_mixer()
+            return False
+
+        return True
+
+    def close_mixer(self):
+        if self.mixer is not None:
+            self.mixer.close()
+        self.mixer = None
+        self.element = None
+
+    def on_mixer_event(self):
+        if not self.volume_step_busy:
+            self.update(self.poll())
+
+    def on_mixer_error(self):
+        self.close_mixer()
+        base.InLoopPollText.timer_setup(self)
+
+    @property
+    def volume_step_blocking(self):
+        return self.element is None
+
+    def reconcile_volume(self):
+        if self.element is not None:
+            self.update(self.poll())
+        else:
+            super().reconcile_volume()
+
+    def finalize(self):
+        self.close_mixer()
+        super().finalize()
+
     def setup_images(self):
-        d_imgs = {}
-        for icon_level, icon_name in self.icon_names:
-            icon = get_icon_path(
-                icon_name, size=self.icon_size,
-                theme=self.theme_path, extensions=(self.icon_ext.lstrip('.'),))
-            if icon:
-                if icon.endswith('.svg'):  # symbolic icon
-                    with open(icon, 'r') as f:
-                        data = re.sub(r'fill="(#?[A-Za-z0-9]+)"', self._replace_svg_attr, f.read())
-                        d_imgs[icon_name] = images.Img(data.encode(), icon_name, icon)
-                else:
-                    with open(icon, 'rb') as f:
-                        d_imgs[icon_name] = images.Img(f.read(), icon_name, icon)
-
-        for key, img in d_imgs.items():
-            img.resize(height=self.icon_size)
-            if img.width > self.length:
-                self.length = img.width + self.padding_x * 2
-            self.images[key] = img
+        super().setup_images(icon_name for icon_level, icon_name in self.icon_names)
 
     def calculate_length(self):
         return self.icon_size + self.padding_x * 2
 
     def get_volume(self):
+        if self.element is not None:
+            try:
+                return self.element.get_volume(), self.element.is_muted()
+            except OSError:
+                logger.exception('Cannot read ALSA mixer:')
+                return -1, False
+
         try:
             if self.get_volume_command is not None:
                 get_volume_cmd = self.get_volume_command
             else:
                 get_volume_cmd = self.create_amixer_command("sget", self.channel)
 
-            mixer_out = subprocess.getoutput(get_volume_cmd)
-        except subprocess.CalledProcessError:
+            mixer_out = self.run_getoutput(get_volume_cmd, shell=True)
+        except (OSError, subprocess.TimeoutExpired):
             return -1, False
 
         check_mute = mixer_out
         if self.check_mute_command:
-            check_mute = subprocess.getoutput(self.check_mute_command)
+            check_mute = self.run_getoutput(self.check_mute_command, shell=True)
 
         muted = self.check_mute_string in check_mute
 
@@ -189,48 +254,59 @@ class Volume(IconTextMixin, base.PaddingMixin, base.InLoopPollText):
         if self.is_mute:
             return
 
-        if self.volume_up_command is not None:
-            volume_up_cmd = self.volume_up_command
-        else:
-            volume_up_cmd = self.create_amixer_command(
-                "-q", "sset", self.channel, f"{self.step}%+"
-            )
-
-        subprocess.call(volume_up_cmd, shell=True)
-        self.update(self.poll())
-
-        if self.volume >= 0:
-            text = '{}%'.format(self.volume)
-            qtile.widgets_map['notification'].update(text, self.volume / 100)
+        self.queue_volume_step(self.step)
 
     @expose_command()
     def decrease_vol(self):
         if self.is_mute:
             return
 
-        if self.volume_down_command is not None:
-            volume_down_cmd = self.volume_down_command
-        else:
-            volume_down_cmd = self.create_amixer_command(
-                "-q", "sset", self.channel, f"{self.step}%-"
-            )
+        self.queue_volume_step(-self.step)
+
+    def get_volume_level(self):
+        if self.volume is None or self.volume < 0:
+            return None
+        return self.volume
+
+    def show_volume_level(self, level):
+        self.update((level, self.is_mute))
 
-        subprocess.call(volume_down_cmd, shell=True)
-        self.update(self.poll())
+        text = '{}%'.format(self.volume)
+        qtile.widgets_map['notification'].update(text, self.volume / 100)
 
-        if self.volume >= 0:
-            text = '{}%'.format(self.volume)
-            qtile.widgets_map['notification'].update(text, self.volume / 100)
+    def apply_volume_step(self, level, delta):
+        if self.element is not None:
+            if level is None:
+                level = min(max(self.element.get_volume() + delta, 0), 100)
+            self.element.set_volume(level)
+            return
+
+        if delta > 0 and self.volume_up_command is not None:
+            cmds = [self.volume_up_command] * max(delta // self.step, 1)
+        elif delta < 0 and self.volume_down_command is not None:
+            cmds = [self.volume_down_command] * max(-delta // self.step, 1)
+        elif level is None:
+            sign = '+' if delta > 0 else '-'
+            cmds = [self.create_amixer_command("-q", "sset", self.channel, f"{abs(delta)}%{sign}")]
+        else:
+            cmds = [self.create_amixer_command("-q", "sset", self.channel, f"{level}%")]
+
+        for cmd in cmds:
+            self.run_call(cmd, shell=True)
 
     @expose_command()
     def mute(self):
+        if self.element is not None:
+            self.element.toggle_mute()
+            self.update(self.poll())
+            return
+
         if self.mute_command is not None:
             mute_cmd = self.mute_command
         else:
             mute_cmd = self.create_amixer_command("-q", "sset", self.channel, "toggle")
 
-        subprocess.call(mute_cmd, shell=True)
-        self.update(self.poll())
+        self.run_spawn(mute_cmd, shell=True, callback=lambda returncode: self.tick())
 
     @expose_command()
     def run_app(self):
@@ -1,4 +1,3 @@
-import json
 import re
 import os
 import subprocess
@@ -8,10 +7,11 @@ from libqtile.command.base import expose_command
 from libqtile.log_utils import logger
 from libqtile.widget import base
 
-from .mixins import IconTextMixin
+from ..tools import dbus, networkmanager, rfkill, wireless
+from .mixins import IconTextMixin, RfkillMixin, RunnerMixin
 
 
-class Wifi(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
+class Wifi(RfkillMixin, RunnerMixin, IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
     icon_names = (
         'network-wireless-acquiring-symbolic',
         'network-wireless-connected-symbolic',
@@ -32,6 +32,7 @@ class Wifi(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
         'network-wireless-signal-weak-secure-symbolic',
         'network-wireless-signal-weak-symbolic',
     )
+    rfkill_type = 'wlan'
 
     def __init__(self, **config):
         # self.foreground = config.get('foreground', '#ffffff')
@@ -41,6 +42,8 @@ class Wifi(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
         self.images = {}
         self.signal = -3
         self.current_icon = 'network-wireless-hardware-disabled-symbolic'
+        # 'dbus' mirrors NetworkManager signals, 'nmcli' polls the command
+        self.backend = config.get('backend', 'dbus')
 
         base.ThreadPoolText.__init__(self, '', **config)
         self.add_defaults(base.PaddingMixin.defaults)
@@ -61,6 +64,33 @@ class Wifi(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
         base.ThreadPoolText._configure(self, qtile, pbar)
         self.setup_images()
 
+    def timer_setup(self):
+        if self.backend != 'dbus':
+            base.ThreadPoolText.timer_setup(self)
+
+    async def _config_async(self):
+        await super()._config_async()
+        if self.backend != 'dbus':
+            return
+
+        try:
+            await networkmanager.state.start()
+        except (OSError, dbus.DBusError):
+            logger.exception('Cannot connect to NetworkManager, falling back to nmcli:')
+            self.backend = 'nmcli'
+            base.ThreadPoolText.timer_setup(self)
+            return
+
+        networkmanager.state.subscribe(self.on_network)
+        self.on_network()
+
+    def finalize(self):
+        networkmanager.state.unsubscribe(self.on_network)
+        super().finalize()
+
+    def on_network(self):
+        self.update(self.get_signal())
+
     def get_icon_key(self, signal):
         secure = False
         if signal > 1000:
@@ -96,28 +126,34 @@ class Wifi(IconTextMixin, base.PaddingMixin, base.ThreadPoolText):
 
     @expose_command()
     def block(self):
-        subprocess.call(['rfkill', 'toggle', 'wlan'])
-        self.update(self.get_signal())
+        rfkill.monitor.toggle('wlan', owner=self.name)
 
     def get_signal(self):
-        rfkill = json.loads(subprocess.check_output(['rfkill', '-J']).decode())
-        for dev in rfkill['rfkilldevices']:
-            if dev['type'] == 'wlan' and dev['hard'] == 'blocked':
-                return -3
-            elif dev['type'] == 'wlan' and dev['soft'] == 'blocked':
-                return -2
-
-        signal = 0
-        out = subprocess.check_output(['nmcli', '-f', 'IN-USE,SIGNAL', 'd', 'wifi']).decode()
-        for line in out.split('\n'):
-            if line.strip().startswith('*'):
-                signal = int(line.strip().lstrip('*'))
-                break
-        else:
+        signal = self.get_rfkill_signal()
+        if signal is not None:
+            return signal
+
+        if self.backend == 'dbus':
+            signal = networkmanager.state.signal
+            if signal >= 0 and networkmanager.state.vpn:
+                signal += 1000
+            return signal
+
+        signal = wireless.get_signal()
+        if signal is None:
+            signal = 0
+            out = self.run_output(['nmcli', '-f', 'IN-USE,SIGNAL', 'd', 'wifi'])
+            for line in out.split('\n'):
+                if line.strip().startswith('*'):
+                    signal = int(line.strip().lstrip('*'))
+                    break
+            else:
+                return -1
+        elif signal < 0:
             return -1
 
         secure = False
-        out = subprocess.check_output(['nmcli', '-f', 'TYPE', 'c', 'show', '--active']).decode()
+        out = self.run_output(['nmcli', '-f', 'TYPE', 'c', 'show', '--active'])
         for line in out.split('\n'):
             if line.strip() == 'vpn':
                 secure = True
@@ -0,0 +1,51 @@
+import os
+
+from qtilemods.tools import wireless
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'wireless')
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+def test_read_associated():
+    assert wireless.read_wireless(fixture('associated.txt')) == {
+        'wlp2s0': {'status': '0000', 'link': 54.0, 'level': -56.0, 'noise': -256.0},
+    }
+
+
+def test_read_header_only():
+    assert wireless.read_wireless(fixture('header_only.txt')) == {}
+
+
+def test_read_missing_file():
+    assert wireless.read_wireless(fixture('missing.txt')) is None
+
+
+def test_dbm_to_percent():
+    # nl80211_xbm_to_percent() of NetworkManager gives the same
+    assert wireless.get_signal(path=fixture('associated.txt')) == 64
+
+
+def test_dbm_out_of_range():
+    assert wireless.get_signal('wlan0', fixture('out_of_range.txt')) == 30
+    assert wireless.get_signal('wlan1', fixture('out_of_range.txt')) == 100
+
+
+def test_link_quality_without_dbm():
+    assert wireless.get_signal(path=fixture('link_only.txt')) == 50
+
+
+def test_best_interface():
+    assert wireless.get_signal(path=fixture('multiple.txt')) == 75
+    assert wireless.get_signal('wlan0', fixture('multiple.txt')) == 50
+
+
+def test_no_interface():
+    assert wireless.get_signal(path=fixture('header_only.txt')) == -1
+    assert wireless.get_signal('wlan0', fixture('associated.txt')) == -1
+
+
+def test_no_wireless():
+    assert wireless.get_signal(path=fixture('missing.txt')) is None